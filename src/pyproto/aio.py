@@ -0,0 +1,118 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""asyncio integration of proto conversion.
+
+Converting large protos inline stalls the event loop, so conversions are
+offloaded to an executor, with a bounded number of conversions in flight. A
+cooperative mode converts on the event loop instead, and yields to it every few
+protos or milliseconds.
+
+  Typical usage example:
+
+  converter = ProtoConverter(
+        pb_class_from=proto1_pb2.Proto1,
+        pb_class_to=proto2_pb2.Proto2)
+  proto2 = await converter.convert_async(proto1)
+  async for proto2 in converter.convert_aiter(proto1_source, concurrency=8):
+    ...
+"""
+
+import asyncio
+import collections
+from concurrent import futures
+from typing import Any, AsyncIterable, AsyncIterator, Iterable, Optional, Union
+
+DEFAULT_CONCURRENCY = 4
+DEFAULT_YIELD_EVERY = 100
+DEFAULT_YIELD_INTERVAL = 0.005
+
+
+async def convert_async(converter: Any,
+                        src_proto: Any,
+                        executor: Optional[futures.Executor] = None) -> Any:
+  """Converts src_proto in executor, the loop's default executor if None."""
+
+  loop = asyncio.get_running_loop()
+  return await loop.run_in_executor(executor, converter.convert, src_proto)
+
+
+async def convert_aiter(
+    converter: Any,
+    src_protos: Union[AsyncIterable[Any], Iterable[Any]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    executor: Optional[futures.Executor] = None,
+    cooperative: bool = False,
+    yield_every: int = DEFAULT_YIELD_EVERY,
+    yield_interval: float = DEFAULT_YIELD_INTERVAL) -> AsyncIterator[Any]:
+  """Converts the protos of an async or sync iterable, in order.
+
+  Args:
+    converter: the ProtoConverter.
+    src_protos: the protos to convert.
+    concurrency: the maximum number of conversions in flight. No more protos
+      are read from src_protos until the oldest conversion is consumed.
+    executor: the executor converting the protos, the loop's default executor
+      if None.
+    cooperative: if True, converts the protos on the event loop instead of an
+      executor, yielding to the loop every yield_every protos or
+      yield_interval seconds, whichever comes first.
+    yield_every: the number of protos converted between yields in cooperative
+      mode.
+    yield_interval: the number of seconds between yields in cooperative mode.
+
+  Yields:
+    The converted protos.
+  """
+
+  if concurrency < 1:
+    raise ValueError(
+        "concurrency must be positive, got {}.".format(concurrency))
+
+  loop = asyncio.get_running_loop()
+  if cooperative:
+    count = 0
+    deadline = loop.time() + yield_interval
+    async for src_proto in _aiter(src_protos):
+      yield converter.convert(src_proto)
+      count += 1
+      if count >= yield_every or loop.time() >= deadline:
+        await asyncio.sleep(0)
+        count = 0
+        deadline = loop.time() + yield_interval
+    return
+
+  pending = collections.deque()
+  try:
+    async for src_proto in _aiter(src_protos):
+      pending.append(
+          loop.run_in_executor(executor, converter.convert, src_proto))
+      if len(pending) >= concurrency:
+        yield await pending.popleft()
+    while pending:
+      yield await pending.popleft()
+  finally:
+    for future in pending:
+      future.cancel()
+
+
+async def _aiter(src_protos):
+  """Iterates over an async or sync iterable."""
+
+  if hasattr(src_protos, "__aiter__"):
+    async for src_proto in src_protos:
+      yield src_proto
+  else:
+    for src_proto in src_protos:
+      yield src_proto
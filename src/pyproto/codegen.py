@@ -0,0 +1,424 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Ahead-of-time generator of proto converter modules.
+
+This module emits a plain Python module with one converter function per
+message pair of two proto packages. Messages are paired by their name relative
+to the package, and fields are auto-converted with the same rules as
+ProtoConverter. Fields of different but paired message types are converted by
+the generated function of that pair, so nested messages shared across pairs
+reuse one helper.
+
+  Typical usage example:
+
+  python -m pyproto.codegen --src_module=proto1_pb2 --dest_module=proto2_pb2 \
+      --output=proto1_to_proto2.py
+
+  python -m pyproto.codegen --descriptor_set=protos.pb \
+      --src_package=pkg.v1 --dest_package=pkg.v2 --output=v1_to_v2.py
+
+The generated module provides convert_<Message>(src_proto) functions, a
+CONVERTERS dict keyed by (src full name, dest full name) and an
+UNHANDLED_FIELDS dict listing the source fields that were left out.
+"""
+
+import argparse
+import importlib
+import sys
+from typing import Dict, List, Optional
+
+from google.protobuf import descriptor
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+
+from pyproto import converter
+
+_HEADER = '''"""Proto converters generated by pyproto.codegen. DO NOT EDIT."""
+
+import math
+'''
+
+
+def generate_source(src_messages: Dict[str, descriptor.Descriptor],
+                    dest_messages: Dict[str, descriptor.Descriptor],
+                    module_names: Optional[Dict[str, str]] = None,
+                    allow_unhandled: bool = False) -> str:
+  """Generates the source of a converter module.
+
+  Pairs with fields that can't be converted are listed in UNHANDLED_FIELDS,
+  and only get a converter function if allow_unhandled is True, since it
+  drops these fields.
+
+  Args:
+    src_messages: relative message name to descriptor of the protos to convert
+      from.
+    dest_messages: relative message name to descriptor of the protos to
+      convert to.
+    module_names: proto file name to the name of its _pb2 module. Files not
+      listed are imported by the protoc naming convention.
+    allow_unhandled: if True, pairs with unhandled fields get converter
+      functions converting their other fields.
+
+  Returns:
+    The source of the generated module.
+  """
+
+  pairs = {}
+  for name in sorted(src_messages):
+    if name in dest_messages and not _is_map_entry(src_messages[name]):
+      pairs[src_messages[name]] = (name, dest_messages[name])
+
+  fields_by_pair = {
+      src: _get_convertible_fields(src, dest)
+      for src, (_, dest) in pairs.items()
+  }
+  helpers = _get_complete_pairs(pairs, fields_by_pair)
+  for src, fields in fields_by_pair.items():
+    for name, dest_field in list(fields.items()):
+      src_field = src.fields_by_name[name]
+      if (_is_nested_pair_field(src_field, dest_field) and
+          not _is_helper_pair(src_field, dest_field, helpers, pairs)):
+        del fields[name]
+
+  imports = {}
+  for src, (_, dest) in pairs.items():
+    for message in (src, dest):
+      imports.setdefault(
+          message.file.name,
+          (module_names or {}).get(message.file.name) or
+          _module_name(message.file))
+  aliases = {
+      file_name: "_pb2_{}".format(index)
+      for index, file_name in enumerate(sorted(imports))
+  }
+
+  lines = [_HEADER]
+  for file_name in sorted(imports):
+    lines.append("import {} as {}".format(imports[file_name],
+                                          aliases[file_name]))
+  lines.extend([
+      "",
+      "_copysign = math.copysign",
+  ])
+
+  converters = []
+  unhandled = {}
+  for src, (name, dest) in pairs.items():
+    unhandled_fields = [
+        field.name
+        for field in src.fields
+        if field.name not in fields_by_pair[src]
+    ]
+    if unhandled_fields:
+      unhandled[src.full_name] = unhandled_fields
+      if not allow_unhandled:
+        continue
+
+    function_name = _function_name(name)
+    lines.extend(["", ""])
+    lines.extend(
+        _generate_pair_lines(function_name, src, fields_by_pair[src], pairs))
+    lines.extend([
+        "",
+        "",
+        "def convert_{}(src_proto):".format(function_name),
+        "  \"\"\"Converts {} to {}.\"\"\"".format(src.full_name,
+                                                dest.full_name),
+        "  dest_proto = {}()".format(_class_source(dest, aliases)),
+        "  _convert_{}(src_proto, dest_proto)".format(function_name),
+        "  return dest_proto",
+    ])
+    converters.append((src.full_name, dest.full_name, function_name))
+
+  lines.extend(["", "", "CONVERTERS = {"])
+  for src_name, dest_name, function_name in converters:
+    lines.append("    ({!r}, {!r}): convert_{},".format(
+        src_name, dest_name, function_name))
+  lines.extend(["}", "", "UNHANDLED_FIELDS = {"])
+  for src_name in sorted(unhandled):
+    lines.append("    {!r}: {!r},".format(src_name, tuple(unhandled[src_name])))
+  lines.append("}")
+
+  return "\n".join(lines) + "\n"
+
+
+def _get_convertible_fields(src, dest):
+  """Gets the src field name to dest field of the fields to generate."""
+
+  dest_fields_by_name = dest.fields_by_name
+  fields = {}
+  for src_field in src.fields:
+    dest_field = dest_fields_by_name.get(src_field.name)
+    if dest_field is None:
+      continue
+    if (converter._is_src_field_auto_convertible(
+        src_field, dest_fields_by_name) or
+        _is_nested_pair_field(src_field, dest_field)):
+      fields[src_field.name] = dest_field
+
+  # Oneof fields mapping to more than one field are left to the user.
+  try:
+    converter._validate_oneof_field_multi_mapping(
+        src, dest, _get_skipped_field_names(src, fields))
+    converter._validate_oneof_field_multi_mapping(
+        dest, src, _get_skipped_field_names(src, fields))
+  except NotImplementedError:
+    fields = {
+        name: dest_field
+        for name, dest_field in fields.items()
+        if src.fields_by_name[name].containing_oneof is None and
+        dest_field.containing_oneof is None
+    }
+
+  return fields
+
+
+def _get_skipped_field_names(src, fields):
+  return [field.name for field in src.fields if field.name not in fields]
+
+
+def _is_nested_pair_field(src_field, dest_field):
+  """Checks if the fields hold different message types to convert as a pair."""
+
+  if (src_field.label != dest_field.label or
+      src_field.type != dest_field.type or
+      src_field.type != descriptor.FieldDescriptor.TYPE_MESSAGE):
+    return False
+
+  if converter._is_map_field(src_field):
+    src_fields_by_name = src_field.message_type.fields_by_name
+    dest_fields_by_name = dest_field.message_type.fields_by_name
+    return (converter._is_src_field_auto_convertible(
+        src_fields_by_name["key"], dest_fields_by_name) and
+            _is_nested_pair_field(src_fields_by_name["value"],
+                                  dest_fields_by_name["value"]))
+
+  return (not converter._is_any_field(src_field) and
+          not converter._is_any_field(dest_field) and
+          src_field.message_type != dest_field.message_type)
+
+
+def _get_nested_pair(src_field, dest_field):
+  """Gets the (src, dest) message types converted by a generated helper."""
+
+  if converter._is_map_field(src_field):
+    src_field = src_field.message_type.fields_by_name["value"]
+    dest_field = dest_field.message_type.fields_by_name["value"]
+  return src_field.message_type, dest_field.message_type
+
+
+def _get_complete_pairs(pairs, fields_by_pair):
+  """Gets the pairs whose generated functions convert every field.
+
+  Only these are used for nested fields, so nested conversion never silently
+  drops data. The pairs are computed as a fixed point, which also supports
+  recursive messages.
+
+  Args:
+    pairs: src descriptor to (relative name, dest descriptor).
+    fields_by_pair: src descriptor to its convertible fields.
+
+  Returns:
+    The set of src descriptors of the complete pairs.
+  """
+
+  complete = {
+      src for src in pairs if len(fields_by_pair[src]) == len(src.fields)
+  }
+  changed = True
+  while changed:
+    changed = False
+    for src in list(complete):
+      for name, dest_field in fields_by_pair[src].items():
+        src_field = src.fields_by_name[name]
+        if not _is_nested_pair_field(src_field, dest_field):
+          continue
+        if not _is_helper_pair(src_field, dest_field, complete, pairs):
+          complete.discard(src)
+          changed = True
+          break
+
+  return complete
+
+
+def _is_helper_pair(src_field, dest_field, helpers, pairs):
+  """Checks if a generated helper converts the nested types of the fields."""
+
+  nested_src, nested_dest = _get_nested_pair(src_field, dest_field)
+  return nested_src in helpers and pairs[nested_src][1] == nested_dest
+
+
+def _generate_pair_lines(function_name, src, fields, pairs):
+  """Generates the function filling the dest proto of a pair."""
+
+  lines = ["def _convert_{}(src_proto, dest_proto):".format(function_name)]
+  body = []
+  src_fields = sorted((src.fields_by_name[name] for name in fields),
+                      key=lambda field: field.number)
+  for src_field in src_fields:
+    body.extend(
+        _generate_field_lines(src_field, fields[src_field.name], pairs))
+  lines.extend("  " + line for line in body or ["pass"])
+  return lines
+
+
+def _generate_field_lines(src_field, dest_field, pairs):
+  """Generates the statements converting one field."""
+
+  if not _is_nested_pair_field(src_field, dest_field):
+    kind = converter._select_action_kind(src_field, dest_field)
+    action = converter._FieldAction(kind, src_field, dest_field, None)
+    return converter._generate_action_lines(action)
+
+  nested_src, _ = _get_nested_pair(src_field, dest_field)
+  helper = "_convert_" + _function_name(pairs[nested_src][0])
+  src_value = converter._attribute_source("src_proto", src_field.name)
+  dest_value = converter._attribute_source("dest_proto", dest_field.name)
+  if converter._is_map_field(src_field):
+    return [
+        "dest_field = " + dest_value,
+        "for key, element in {}.items():".format(src_value),
+        "  {}(element, dest_field[key])".format(helper),
+    ]
+  if src_field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+    return [
+        "dest_field = " + dest_value,
+        "for element in {}:".format(src_value),
+        "  {}(element, dest_field.add())".format(helper),
+    ]
+  return [
+      "if src_proto.HasField({!r}):".format(src_field.name),
+      "  dest_field = " + dest_value,
+      "  dest_field.SetInParent()",
+      "  {}({}, dest_field)".format(helper, src_value),
+  ]
+
+
+def _is_map_entry(message_descriptor):
+  return (message_descriptor.has_options and
+          message_descriptor.GetOptions().map_entry)
+
+
+def _function_name(relative_name):
+  return relative_name.replace(".", "_")
+
+
+def _class_source(message_descriptor, aliases):
+  """Returns the source referring to the generated class of a message."""
+
+  package = message_descriptor.file.package
+  relative_name = message_descriptor.full_name
+  if package:
+    relative_name = relative_name[len(package) + 1:]
+  return "{}.{}".format(aliases[message_descriptor.file.name], relative_name)
+
+
+def _module_name(file_descriptor):
+  """Returns the name of the _pb2 module generated by protoc for a file."""
+
+  module_name = file_descriptor.name
+  if module_name.endswith(".proto"):
+    module_name = module_name[:-len(".proto")]
+  return module_name.replace("-", "_").replace("/", ".") + "_pb2"
+
+
+def _get_module_messages(module):
+  """Gets relative name to descriptor of all messages of a _pb2 module."""
+
+  messages = {}
+  for message in module.DESCRIPTOR.message_types_by_name.values():
+    _add_messages(message, message.name, messages)
+  return messages
+
+
+def _get_package_messages(pool, file_descriptor_set, package):
+  """Gets relative name to descriptor of all messages in a package."""
+
+  messages = {}
+  for file_proto in file_descriptor_set.file:
+    if file_proto.package != package:
+      continue
+    file_descriptor = pool.FindFileByName(file_proto.name)
+    for message in file_descriptor.message_types_by_name.values():
+      _add_messages(message, message.name, messages)
+  return messages
+
+
+def _add_messages(message, relative_name, messages):
+  messages[relative_name] = message
+  for nested_message in message.nested_types:
+    _add_messages(nested_message, relative_name + "." + nested_message.name,
+                  messages)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+  """Runs the converter code generator."""
+
+  parser = argparse.ArgumentParser(
+      prog="python -m pyproto.codegen",
+      description="Generates a module of converters between two proto "
+      "packages.")
+  parser.add_argument("--src_module", help="_pb2 module to convert from.")
+  parser.add_argument("--dest_module", help="_pb2 module to convert to.")
+  parser.add_argument(
+      "--descriptor_set",
+      help="serialized FileDescriptorSet, used with --src_package and "
+      "--dest_package.")
+  parser.add_argument("--src_package", help="proto package to convert from.")
+  parser.add_argument("--dest_package", help="proto package to convert to.")
+  parser.add_argument(
+      "--output", help="file to write the module to, defaults to stdout.")
+  parser.add_argument(
+      "--allow_unhandled",
+      action="store_true",
+      help="generate converters of message pairs with unhandled fields, "
+      "which drop these fields.")
+  args = parser.parse_args(argv)
+
+  module_names = {}
+  if args.src_module and args.dest_module:
+    src_module = importlib.import_module(args.src_module)
+    dest_module = importlib.import_module(args.dest_module)
+    src_messages = _get_module_messages(src_module)
+    dest_messages = _get_module_messages(dest_module)
+    module_names[src_module.DESCRIPTOR.name] = args.src_module
+    module_names[dest_module.DESCRIPTOR.name] = args.dest_module
+  elif args.descriptor_set and args.src_package and args.dest_package:
+    file_descriptor_set = descriptor_pb2.FileDescriptorSet()
+    with open(args.descriptor_set, "rb") as f:
+      file_descriptor_set.ParseFromString(f.read())
+    pool = descriptor_pool.DescriptorPool()
+    for file_proto in file_descriptor_set.file:
+      pool.AddSerializedFile(file_proto.SerializeToString())
+    src_messages = _get_package_messages(pool, file_descriptor_set,
+                                         args.src_package)
+    dest_messages = _get_package_messages(pool, file_descriptor_set,
+                                          args.dest_package)
+  else:
+    parser.error("either --src_module and --dest_module or --descriptor_set, "
+                 "--src_package and --dest_package are required.")
+
+  source = generate_source(src_messages, dest_messages, module_names,
+                           args.allow_unhandled)
+  if args.output:
+    with open(args.output, "w") as f:
+      f.write(source)
+  else:
+    sys.stdout.write(source)
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -28,12 +28,23 @@ can also be ignored.
   proto2 = converter.convert(proto1)
 """
 
+import collections
 import functools
-from typing import Any, Callable, List, Optional, Type
+import itertools
+import keyword
+import math
+import operator
+import types
+from concurrent import futures
+from typing import (Any, AsyncIterable, AsyncIterator, Callable, Dict,
+                    Iterable, Iterator, List, Optional, Type, Union)
 
 from google.protobuf import any_pb2
 from google.protobuf import descriptor
-from google.protobuf import symbol_database
+from google.protobuf import descriptor_pool as descriptor_pool_lib
+from google.protobuf import message_factory
+
+from pyproto import wire
 
 # We would like to annotate FROM and TO as subclasses of message.Message but not
 # message.Message itself. There currently exists no way to express such a thing,
@@ -42,14 +53,102 @@ from google.protobuf import symbol_database
 FROM = Any
 TO = Any
 
+# Kinds of pre-selected field conversions stored in a compiled plan.
+_SET = "set"  # Scalar and enum fields.
+_COPY = "copy"  # Proto -> Proto and Any -> Any.
+_PACK = "pack"  # Proto -> Any.
+_MERGE = "merge"  # Repeated and map fields of identical element types.
+_PACK_REPEATED = "pack_repeated"  # Proto[] -> Any[].
+_PACK_MAP = "pack_map"  # Map<key, Proto> -> Map<key, Any>.
+_REPACK_ANY_REPEATED = "repack_any_repeated"  # Any[] -> Any[], repacked.
+_UNPACK = "unpack"  # Any -> Proto with auto_unpack_any.
+_UNPACK_REPEATED = "unpack_repeated"  # Any[] -> Proto[] with auto_unpack_any.
+_UNPACK_MAP = "unpack_map"  # Map<key, Any> -> Map<key, Proto>, the same.
+_CONVERT = "convert"  # Proto -> Proto of another type with auto_convert_nested.
+_CONVERT_REPEATED = "convert_repeated"  # Proto[] -> Proto[], the same.
+_CONVERT_MAP = "convert_map"  # Map<key, Proto> -> Map<key, Proto>, the same.
+_NESTED_KINDS = (_CONVERT, _CONVERT_REPEATED, _CONVERT_MAP)
+
+# Plans with more presence checks than this are interpreted over ListFields()
+# instead of being compiled into straight-line code, since the generated
+# function checks the presence of every planned field, or of every dispatched
+# oneof, while wide messages are usually sparse.
+_MAX_GENERATED_ACTIONS = 128
+
+# The number of protos converted at once by lazy convert_many() when there are
+# batch convert functions.
+_LAZY_BATCH_SIZE = 1000
+
+# The maximum number of compiled converters cached by each ProtoConverter class.
+_MAX_COMPILED_CONVERTERS = 256
+
+# The maximum number of pairs of protos whose oneofs validation is cached.
+_MAX_VALIDATED_ONEOF_PAIRS = 1024
+
+# The field number tables of interpreted plans are lists indexed by field
+# number up to this number, and dicts above it.
+_MAX_DENSE_FIELD_NUMBER = 4096
+
+# The maximum number of Any type URLs cached by an _AnyTypeResolver.
+_MAX_RESOLVED_ANY_TYPES = 1024
+
+# The type URL prefix of Any.Pack().
+_DEFAULT_TYPE_URL_PREFIX = "type.googleapis.com/"
+
+# The globals of the generated functions, used by _presence_condition.
+_GENERATED_GLOBALS = types.MappingProxyType({"_copysign": math.copysign})
+
+# How convert_bytes converts serialized protos.
+_WIRE_PASSTHROUGH = "passthrough"  # The bytes are returned as they are.
+_WIRE_REPARSE = "reparse"  # Parsed and serialized as pb_class_from.
+_WIRE_TRANSCODE = "transcode"  # Tags rewritten, see wire.transcode.
+_WIRE_CONVERT = "convert"  # Parsed, converted and serialized.
+
+# ProtoConverter attributes set by ProtoConverter._compile.
+_COMPILED_ATTRIBUTES = (
+    "_function_convert_field_names",
+    "_convert_functions",
+    "_run_convert_functions",
+    "_run_unbatched_convert_functions",
+    "_batch_convert_functions",
+    "_unconverted_fields",
+    "_any_type_resolver",
+    "_nested_plans",
+    "_plan",
+    "_path_mappings",
+    "_auto_convert_function",
+    "_wire_mode",
+    "_tag_table",
+    "_wire_fallback_function",
+)
+
 
 class ProtoConverter(object):
   """A converter to convert Protos in Python."""
 
+  # The compiled attributes of instances, keyed by their constructor arguments.
+  # Each subclass has its own cache, set by __init_subclass__, since the
+  # handlers depend on the class. The cache is bounded and evicts the least
+  # recently used entries first, since its keys hold the proto classes, pools
+  # and converters of the arguments.
+  _compiled_cache = collections.OrderedDict()
+
+  def __init_subclass__(cls, **kwargs):
+    super().__init_subclass__(**kwargs)
+    cls._compiled_cache = collections.OrderedDict()
+
   def __init__(self,
                pb_class_from: Type[FROM],
                pb_class_to: Type[TO],
-               field_names_to_ignore: Optional[List[str]] = None):
+               field_names_to_ignore: Optional[List[str]] = None,
+               repack_any: bool = False,
+               auto_unpack_any: bool = False,
+               auto_convert_nested: bool = False,
+               field_converters: Optional[Dict[str, Union[
+                   Type["ProtoConverter"], "ProtoConverter"]]] = None,
+               field_mapping: Optional[Dict[str, str]] = None,
+               descriptor_pool: Optional[
+                   descriptor_pool_lib.DescriptorPool] = None):
     """Constructor for the ProtoConverter.
 
     Args:
@@ -57,6 +156,31 @@ class ProtoConverter(object):
       pb_class_to: the init method for the proto to convert to.
       field_names_to_ignore: the fields from the source proto that will be
         ignored by the converter.
+      repack_any: if True, repeated Any fields are copied by unpacking and
+        packing each element again, which normalizes their type URLs but
+        requires their types in the default descriptor pool. By default, their
+        type URLs and serialized values are copied as they are.
+      auto_unpack_any: if True, Any fields are auto-converted to fields of
+        other proto types, including repeated and map fields. The type URL of
+        each Any is checked against the destination type when converting, and
+        TypeError is raised if it doesn't match.
+      auto_convert_nested: if True, fields of different proto types are
+        auto-converted, including repeated and map fields, as long as all the
+        fields of the nested protos are auto-convertible.
+      field_converters: source field name to the converter of its nested
+        protos, for singular, repeated and map fields. Converter classes are
+        created once with the message classes of the fields, and converter
+        instances must convert between these message classes.
+      field_mapping: source field path to destination field path, e.g.
+        {"name": "title", "box.mochi": "mochi"}, to convert fields with other
+        names or at other depths. Paths are dotted names of fields, and all
+        but the last field must be singular proto fields. The fields must be
+        auto-convertible, and their parent protos are created as needed. The
+        first field of a longer source path is still converted as usual if
+        it's auto-convertible, otherwise its other fields must be mapped or
+        ignored by path, e.g. "box.name", unless it's handled.
+      descriptor_pool: the pool resolving the types of the repeated Any fields
+        repacked with repack_any, the default pool if None.
 
     Returns:
       ProtoConverter
@@ -69,14 +193,144 @@ class ProtoConverter(object):
 
     if field_names_to_ignore is None:
       field_names_to_ignore = []
+    if field_converters is None:
+      field_converters = {}
+    if field_mapping is None:
+      field_mapping = {}
 
     self._pb_class_from = pb_class_from
     self._pb_class_to = pb_class_to
     self._field_names_to_ignore = field_names_to_ignore
+    self._repack_any = repack_any
+    self._auto_unpack_any = auto_unpack_any
+    self._auto_convert_nested = auto_convert_nested
+    self._field_converters = field_converters
+    self._field_mapping = field_mapping
+    self._descriptor_pool = descriptor_pool
+
+    self._compile()
+
+  def __getstate__(self):
+    # Compiled state holds generated functions, which can't be pickled. It's
+    # rebuilt by __setstate__, e.g. in the workers of convert_parallel.
+    state = self.__dict__.copy()
+    for name in _COMPILED_ATTRIBUTES:
+      state.pop(name, None)
+    return state
+
+  def __setstate__(self, state):
+    self.__dict__.update(state)
+    self._compile()
+
+  def _compile(self):
+    """Validates the handled fields and compiles the conversion.
+
+    The result only depends on the class and the constructor arguments, so it's
+    cached by class and shared by the following instances.
+    """
+
+    key = (self._pb_class_from, self._pb_class_to,
+           frozenset(self._field_names_to_ignore), self._repack_any,
+           self._auto_unpack_any, self._auto_convert_nested,
+           frozenset(self._field_converters.items()),
+           frozenset(self._field_mapping.items()), self._descriptor_pool)
+    cache = self._compiled_cache
+    compiled = cache.get(key)
+    if compiled is None:
+      self._compile_uncached()
+      compiled = {
+          name: self.__dict__[name]
+          for name in _COMPILED_ATTRIBUTES
+          if name in self.__dict__
+      }
+      cache[key] = compiled
+      while len(cache) > _MAX_COMPILED_CONVERTERS:
+        try:
+          cache.popitem(last=False)
+        except KeyError:
+          # Another thread emptied the cache.
+          break
+      return
+
+    try:
+      cache.move_to_end(key)
+    except KeyError:
+      # Another thread evicted the entry.
+      pass
+    self.__dict__.update(compiled)
+    # The lists are owned by each instance.
+    self._function_convert_field_names = list(
+        compiled["_function_convert_field_names"])
+    self._convert_functions = list(compiled["_convert_functions"])
+    self._unconverted_fields = list(compiled["_unconverted_fields"])
+
+  def _compile_uncached(self):
+    """Validates the handled fields and compiles the conversion."""
+
     self._function_convert_field_names = []  # type: List[str]
     self._convert_functions = []  # type: List[Callable]
 
+    self._any_type_resolver = None
+    if self._repack_any:
+      self._any_type_resolver = _AnyTypeResolver(self._descriptor_pool)
+    repack_any_resolver = self._any_type_resolver
+    self._nested_plans = None
+    if self._auto_convert_nested:
+      self._nested_plans = _NestedPlans(self._auto_unpack_any,
+                                        repack_any_resolver)
+
     self._assert_all_fields_are_handled()
+    renamed_fields, self._path_mappings = self._compile_field_mapping(
+        repack_any_resolver)
+    moved_field_names = {
+        mapping.src_path[0].name
+        for mapping in self._path_mappings
+        if len(mapping.src_path) == 1
+    }
+    # Value handlers assign, extend or merge into their destination fields, so
+    # their source fields aren't auto-converted too.
+    value_field_names = {
+        function.convert_value_field_names[0]
+        for function in self._convert_functions
+        if hasattr(function, "convert_value_field_names")
+    }
+    self._plan = _build_plan(
+        self._pb_class_from.DESCRIPTOR, self._pb_class_to.DESCRIPTOR,
+        set(self._field_names_to_ignore) | set(self._unconverted_fields)
+        | moved_field_names | value_field_names, repack_any_resolver,
+        self._nested_plans, self._get_field_converter_functions(),
+        renamed_fields)
+    # The source protos of the mapped paths are converted from the fallback
+    # bytes of convert_bytes.
+    path_mapped_field_names = {
+        mapping.src_path[0].name for mapping in self._path_mappings
+    }
+    self._auto_convert_function = _make_auto_convert_function(
+        self._pb_class_from.DESCRIPTOR, self._pb_class_to.DESCRIPTOR,
+        self._plan, self._path_mappings)
+    self._batch_convert_functions = tuple(
+        function.convert_batch_function
+        for function in self._convert_functions
+        if hasattr(function, "convert_batch_function"))
+    self._run_unbatched_convert_functions = _make_convert_functions_runner([
+        function for function in self._convert_functions
+        if not hasattr(function, "convert_batch_function")
+    ], self._pb_class_from.DESCRIPTOR, self._pb_class_to.DESCRIPTOR)
+    self._run_convert_functions = _make_batch_functions_runner(
+        self._run_unbatched_convert_functions, self._batch_convert_functions)
+    if self._nested_plans is not None:
+      self._nested_plans.link()
+    self._wire_mode = _get_wire_mode(self._pb_class_from, self._pb_class_to,
+                                     self._plan, self._convert_functions,
+                                     path_mapped_field_names)
+    if self._wire_mode == _WIRE_TRANSCODE:
+      self._tag_table, fallback_plan = _build_tag_table(
+          self._plan, self._pb_class_from, path_mapped_field_names)
+      self._wire_fallback_function = None
+      if fallback_plan or self._path_mappings:
+        self._wire_fallback_function = _compile_auto_convert_function(
+            self._pb_class_from.DESCRIPTOR, self._pb_class_to.DESCRIPTOR,
+            fallback_plan, self._path_mappings)
 
   def _assert_all_fields_are_handled(self):
     """Asserts all unhandled fields has been handled by user functions."""
@@ -91,23 +345,46 @@ class ProtoConverter(object):
         self._function_convert_field_names.extend(function.convert_field_names)
 
     src_proto_fields = self._pb_class_from.DESCRIPTOR.fields
+    src_proto_fields_by_name = self._pb_class_from.DESCRIPTOR.fields_by_name
     dest_proto_fields_by_name = self._pb_class_to.DESCRIPTOR.fields_by_name
 
+    for src_path in self._field_mapping:
+      _get_field_path(self._pb_class_from.DESCRIPTOR, src_path)
+    # Fields mapped as a whole aren't converted to the field of their name.
+    moved_field_names = {
+        path for path in self._field_mapping if "." not in path
+    }
+    mapped_root_field_names = {
+        path.split(".")[0] for path in self._field_mapping if "." in path
+    }
+    mapped_dest_field_names = {
+        path.split(".")[0] for path in self._field_mapping.values()
+    }
     self._unconverted_fields = _get_unhandled_fields(
         src_proto_fields, dest_proto_fields_by_name,
-        self._field_names_to_ignore)
+        set(self._field_names_to_ignore) | set(self._field_converters)
+        | moved_field_names, self._auto_unpack_any, self._nested_plans)
 
     if self._pb_class_from.DESCRIPTOR.oneofs:
-      _validate_oneof_field_multi_mapping(self._pb_class_from,
-                                          self._pb_class_to,
-                                          self._field_names_to_ignore)
+      _validate_oneof_field_multi_mapping(
+          self._pb_class_from.DESCRIPTOR, self._pb_class_to.DESCRIPTOR,
+          set(self._field_names_to_ignore) | moved_field_names
+          | (mapped_root_field_names & set(self._unconverted_fields)))
     if self._pb_class_to.DESCRIPTOR.oneofs:
-      _validate_oneof_field_multi_mapping(self._pb_class_to,
-                                          self._pb_class_from,
-                                          self._field_names_to_ignore)
+      _validate_oneof_field_multi_mapping(
+          self._pb_class_to.DESCRIPTOR, self._pb_class_from.DESCRIPTOR,
+          set(self._field_names_to_ignore) | mapped_dest_field_names)
 
     unconverted_fields = (
         set(self._unconverted_fields) - set(self._function_convert_field_names))
+    # The other fields of the unconverted protos of mapped paths must be
+    # mapped or ignored too, e.g. with field_names_to_ignore=["box.name"].
+    for field_name in unconverted_fields & mapped_root_field_names:
+      unconverted_fields.remove(field_name)
+      unconverted_fields.update(
+          _get_unmapped_field_paths(
+              src_proto_fields_by_name[field_name].message_type, field_name,
+              set(self._field_mapping), set(self._field_names_to_ignore)))
 
     if unconverted_fields:
       raise NotImplementedError(
@@ -115,9 +392,428 @@ class ProtoConverter(object):
           "handled or explicitly ignored. Unhandled fields: {}.".format(
               unconverted_fields))
 
+  def _compile_field_mapping(self, repack_any_resolver):
+    """Validates and compiles field_mapping.
+
+    Args:
+      repack_any_resolver: the _AnyTypeResolver of the repeated Any fields to
+        unpack and pack again, if any.
+
+    Returns:
+      (source field name to destination field of the top-level renames, which
+      are planned like other fields, tuple of _PathMapping of the other
+      mappings).
+
+    Raise:
+      ValueError: if a path isn't valid, the fields of a mapping aren't
+      auto-convertible, or a destination field is converted more than once.
+    """
+
+    src_descriptor = self._pb_class_from.DESCRIPTOR
+    dest_descriptor = self._pb_class_to.DESCRIPTOR
+    if len(set(self._field_mapping.values())) != len(self._field_mapping):
+      raise ValueError(
+          "Field mapping converts a destination field more than once: {}."
+          .format(self._field_mapping))
+
+    # Top-level destination fields which are also converted from a source
+    # field with the same name.
+    converted_dest_field_names = (
+        set(src_descriptor.fields_by_name) - set(self._field_names_to_ignore) -
+        set(self._function_convert_field_names) -
+        set(self._unconverted_fields) -
+        {path for path in self._field_mapping if "." not in path})
+
+    renamed_fields = {}
+    path_mappings = []
+    for src_path, dest_path in sorted(self._field_mapping.items()):
+      src_fields = _get_field_path(src_descriptor, src_path)
+      dest_fields = _get_field_path(dest_descriptor, dest_path)
+      src_field = src_fields[-1]
+      dest_field = dest_fields[-1]
+      if not _is_src_field_auto_convertible(
+          src_field, {src_field.name: dest_field}, self._auto_unpack_any,
+          self._nested_plans):
+        raise ValueError(
+            "Field mapping [{}] -> [{}] can't be auto-converted.".format(
+                src_path, dest_path))
+      if dest_path in converted_dest_field_names:
+        raise ValueError(
+            "Field mapping [{}] -> [{}] converts a field which is already "
+            "converted from [{}].".format(src_path, dest_path, dest_path))
+
+      if len(src_fields) == 1 and len(dest_fields) == 1:
+        renamed_fields[src_field.name] = dest_field
+        continue
+      kind = _select_action_kind(src_field, dest_field,
+                                 repack_any_resolver is not None)
+      action = _FieldAction(
+          kind, src_field, dest_field,
+          _make_apply(kind, src_field, dest_field, repack_any_resolver,
+                      self._nested_plans))
+      path_mappings.append(_PathMapping(src_fields, dest_fields, action))
+
+    return renamed_fields, tuple(path_mappings)
+
+  def _get_field_converter_functions(self):
+    """Gets field name to the function converting it with field_converters.
+
+    The functions of repeated fields convert all the protos of the field at
+    once, so that the batch convert functions of their converters are called
+    once per field.
+
+    Raise:
+      ValueError: if a field can't be converted by a converter, or is also
+      ignored or mapped.
+      TypeError: if a converter instance converts other message types.
+    """
+
+    src_fields_by_name = self._pb_class_from.DESCRIPTOR.fields_by_name
+    dest_fields_by_name = self._pb_class_to.DESCRIPTOR.fields_by_name
+    mapped_field_names = {path.split(".")[0] for path in self._field_mapping}
+    functions = {}
+    for field_name, field_converter in self._field_converters.items():
+      if (field_name not in src_fields_by_name or
+          field_name not in dest_fields_by_name):
+        raise ValueError(
+            "Field converter field [{}] must be in both protos.".format(
+                field_name))
+      if field_name in self._field_names_to_ignore:
+        raise ValueError(
+            "Field converter field [{}] can't be ignored.".format(field_name))
+      if field_name in mapped_field_names:
+        raise ValueError(
+            "Field converter field [{}] can't be in field_mapping.".format(
+                field_name))
+
+      src_message_type, dest_message_type = _get_nested_message_types(
+          src_fields_by_name[field_name], dest_fields_by_name[field_name])
+      if isinstance(field_converter, type):
+        field_converter = field_converter(
+            pb_class_from=_get_message_class(src_message_type),
+            pb_class_to=_get_message_class(dest_message_type))
+      elif (field_converter._pb_class_from.DESCRIPTOR != src_message_type or
+            field_converter._pb_class_to.DESCRIPTOR != dest_message_type):
+        raise TypeError(
+            "Field converter of field [{}] converts [{}] to [{}] instead of "
+            "[{}] to [{}].".format(
+                field_name, field_converter._pb_class_from.DESCRIPTOR.full_name,
+                field_converter._pb_class_to.DESCRIPTOR.full_name,
+                src_message_type.full_name, dest_message_type.full_name))
+      if (_select_field_converter_action_kind(
+          src_fields_by_name[field_name]) == _CONVERT_REPEATED):
+        functions[field_name] = (
+            field_converter._get_convert_many_into_function())
+      else:
+        functions[field_name] = field_converter._get_convert_into_function()
+
+    return functions
+
+  def _get_convert_into_function(self):
+    """Returns a function(src_proto, dest_proto) converting without checks."""
+
+    auto_convert_function = self._auto_convert_function
+    run_convert_functions = self._run_convert_functions
+    if run_convert_functions is None:
+      return auto_convert_function
+
+    def convert_into(src_proto, dest_proto):
+      auto_convert_function(src_proto, dest_proto)
+      run_convert_functions(self, src_proto, dest_proto)
+
+    return convert_into
+
+  def _get_convert_many_into_function(self):
+    """Returns a function(src_protos, dest_protos) converting without checks.
+
+    The batch convert functions are called once with all the protos, like in
+    convert_many.
+    """
+
+    auto_convert_function = self._auto_convert_function
+    run_convert_functions = self._run_unbatched_convert_functions
+    batch_convert_functions = self._batch_convert_functions
+
+    def convert_many_into(src_protos, dest_protos):
+      for src_proto, dest_proto in zip(src_protos, dest_protos):
+        auto_convert_function(src_proto, dest_proto)
+        if run_convert_functions is not None:
+          run_convert_functions(self, src_proto, dest_proto)
+      for batch_function in batch_convert_functions:
+        batch_function(self, src_protos, dest_protos)
+
+    return convert_many_into
+
   def convert(self, src_proto: FROM) -> TO:
     """Converts the src_proto(pb_class_from) to the converter's pb_class_to."""
 
+    self._check_src_type(src_proto)
+
+    dest_proto = self._pb_class_to()
+
+    self._auto_convert_function(src_proto, dest_proto)
+    if self._run_convert_functions is not None:
+      self._run_convert_functions(self, src_proto, dest_proto)
+
+    return dest_proto
+
+  def convert_many(self,
+                   src_protos: Iterable[FROM],
+                   lazy: bool = False,
+                   out: Optional[List[TO]] = None
+                  ) -> Union[List[TO], Iterator[TO]]:
+    """Converts a batch of src_protos(pb_class_from) to pb_class_to.
+
+    The type check and the converter setup are done once per batch instead of
+    once per proto, and batch convert functions are called once with all the
+    protos, or once per chunk of protos if lazy is True.
+
+    Args:
+      src_protos: the protos to convert.
+      lazy: if True, returns a generator converting the protos on demand.
+      out: a list to store the converted protos in. Its elements are replaced
+        in place and it's truncated or extended to the batch size. Can't be
+        used with lazy.
+
+    Returns:
+      The list of converted protos (out if provided), or a generator of them if
+      lazy is True.
+    """
+
+    if lazy:
+      if out is not None:
+        raise ValueError("out can't be used with lazy conversion.")
+      return self._convert_iter(src_protos, _LAZY_BATCH_SIZE)
+
+    if out is None:
+      return list(self._convert_iter(src_protos))
+
+    size = len(out)
+    index = 0
+    for dest_proto in self._convert_iter(src_protos):
+      if index < size:
+        out[index] = dest_proto
+      else:
+        out.append(dest_proto)
+      index += 1
+    del out[index:]
+    return out
+
+  def convert_bytes(self, src_bytes: bytes) -> bytes:
+    """Converts a serialized pb_class_from to a serialized pb_class_to.
+
+    If all source fields are auto-converted to destination fields with the same
+    number, type and label, and there are no user functions, the bytes are
+    wire-compatible and no conversion is done in Python: they are returned as
+    they are if the destination has no other fields, or parsed and serialized
+    once as pb_class_from to drop unknown fields otherwise. The passthrough
+    keeps unknown fields of the source proto.
+
+    Otherwise, if there are no user functions, the wire-compatible fields,
+    which may have different numbers, are transcoded by rewriting their tags,
+    and ignored fields are dropped, without creating any proto. The remaining
+    fields, e.g. fields packed into Any, are parsed into a pb_class_from
+    containing only these fields, converted into an empty pb_class_to and
+    appended in serialized form, which merges them into the result. With user
+    functions, the proto is parsed and converted like with convert, since they
+    may read any field.
+
+    Args:
+      src_bytes: the serialized pb_class_from proto.
+
+    Returns:
+      The serialized pb_class_to proto.
+    """
+
+    if self._wire_mode == _WIRE_PASSTHROUGH:
+      return bytes(src_bytes)
+
+    if self._wire_mode == _WIRE_TRANSCODE:
+      dest_bytes, fallback_bytes = wire.transcode(src_bytes, self._tag_table)
+      if self._wire_fallback_function is not None:
+        src_proto = self._pb_class_from.FromString(bytes(fallback_bytes))
+        dest_proto = self._pb_class_to()
+        self._wire_fallback_function(src_proto, dest_proto)
+        # The proto misses the transcoded fields, which may be required.
+        dest_bytes += dest_proto.SerializePartialToString()
+      return bytes(dest_bytes)
+
+    src_proto = self._pb_class_from.FromString(src_bytes)
+    if self._wire_mode == _WIRE_REPARSE:
+      src_proto.DiscardUnknownFields()
+      return src_proto.SerializeToString()
+
+    return self.convert(src_proto).SerializeToString()
+
+  def convert_parallel(self,
+                       src_protos: Iterable[Union[FROM, bytes]],
+                       workers: Optional[int] = None,
+                       chunk_size: Optional[int] = None,
+                       ordered: bool = True,
+                       serialized: bool = False,
+                       transport: str = "pickle") -> List[Union[TO, bytes]]:
+    """Converts a batch of protos in a pool of processes.
+
+    See parallel.convert_parallel.
+
+    Args:
+      src_protos: the protos to convert, or their serializations.
+      workers: the number of processes, defaults to the number of CPUs.
+      chunk_size: the number of protos sent to a process at once, defaults to
+        parallel.DEFAULT_CHUNK_SIZE.
+      ordered: if False, the results are returned in completion order.
+      serialized: if True, returns the serialized converted protos.
+      transport: "pickle" or "shared_memory", how the protos are sent to the
+        processes.
+
+    Returns:
+      The converted protos, or their serializations if serialized is True.
+    """
+
+    # Imported on first use, so that importing the converter doesn't import
+    # multiprocessing.
+    from pyproto import parallel
+
+    if chunk_size is None:
+      chunk_size = parallel.DEFAULT_CHUNK_SIZE
+    return parallel.convert_parallel(
+        self,
+        src_protos,
+        workers=workers,
+        chunk_size=chunk_size,
+        ordered=ordered,
+        serialized=serialized,
+        transport=transport)
+
+  async def convert_async(self,
+                          src_proto: FROM,
+                          executor: Optional[futures.Executor] = None) -> TO:
+    """Converts src_proto in executor without blocking the event loop.
+
+    Args:
+      src_proto: the proto to convert.
+      executor: the executor to convert in, the loop's default executor if
+        None.
+
+    Returns:
+      The converted proto.
+    """
+
+    # Imported on first use, so that importing the converter doesn't import
+    # asyncio.
+    from pyproto import aio
+
+    return await aio.convert_async(self, src_proto, executor=executor)
+
+  def convert_aiter(
+      self,
+      src_protos: Union[AsyncIterable[FROM], Iterable[FROM]],
+      concurrency: Optional[int] = None,
+      executor: Optional[futures.Executor] = None,
+      cooperative: bool = False,
+      yield_every: Optional[int] = None,
+      yield_interval: Optional[float] = None) -> AsyncIterator[TO]:
+    """Converts the protos of an async or sync iterable, in order.
+
+    See aio.convert_aiter.
+
+    Args:
+      src_protos: the protos to convert.
+      concurrency: the maximum number of conversions in flight, defaults to
+        aio.DEFAULT_CONCURRENCY.
+      executor: the executor to convert in, the loop's default executor if
+        None.
+      cooperative: if True, converts on the event loop, yielding to it every
+        yield_every protos or yield_interval seconds.
+      yield_every: the number of protos converted between yields in
+        cooperative mode, defaults to aio.DEFAULT_YIELD_EVERY.
+      yield_interval: the number of seconds between yields in cooperative
+        mode, defaults to aio.DEFAULT_YIELD_INTERVAL.
+
+    Returns:
+      An async iterator of the converted protos.
+    """
+
+    from pyproto import aio
+
+    if concurrency is None:
+      concurrency = aio.DEFAULT_CONCURRENCY
+    if yield_every is None:
+      yield_every = aio.DEFAULT_YIELD_EVERY
+    if yield_interval is None:
+      yield_interval = aio.DEFAULT_YIELD_INTERVAL
+    return aio.convert_aiter(
+        self,
+        src_protos,
+        concurrency=concurrency,
+        executor=executor,
+        cooperative=cooperative,
+        yield_every=yield_every,
+        yield_interval=yield_interval)
+
+  def _convert_iter(self, src_protos, batch_size=None):
+    """Yields the converted src_protos.
+
+    Args:
+      src_protos: the protos to convert.
+      batch_size: the number of protos passed to each call of the batch convert
+        functions, all the protos if None.
+
+    Yields:
+      The converted protos.
+    """
+
+    if self._batch_convert_functions:
+      for dest_protos in self._convert_batches(src_protos, batch_size):
+        yield from dest_protos
+      return
+
+    pb_class_to = self._pb_class_to
+    auto_convert_function = self._auto_convert_function
+    run_convert_functions = self._run_convert_functions
+    checked_class = None
+    for src_proto in src_protos:
+      if src_proto.__class__ is not checked_class:
+        self._check_src_type(src_proto)
+        checked_class = src_proto.__class__
+
+      dest_proto = pb_class_to()
+      auto_convert_function(src_proto, dest_proto)
+      if run_convert_functions is not None:
+        run_convert_functions(self, src_proto, dest_proto)
+      yield dest_proto
+
+  def _convert_batches(self, src_protos, batch_size):
+    """Yields lists of converted protos, calling the batch convert functions."""
+
+    pb_class_to = self._pb_class_to
+    auto_convert_function = self._auto_convert_function
+    run_convert_functions = self._run_unbatched_convert_functions
+    checked_class = None
+    iterator = iter(src_protos)
+    while True:
+      src_batch = list(itertools.islice(iterator, batch_size))
+      if not src_batch:
+        return
+
+      dest_batch = []
+      for src_proto in src_batch:
+        if src_proto.__class__ is not checked_class:
+          self._check_src_type(src_proto)
+          checked_class = src_proto.__class__
+
+        dest_proto = pb_class_to()
+        auto_convert_function(src_proto, dest_proto)
+        if run_convert_functions is not None:
+          run_convert_functions(self, src_proto, dest_proto)
+        dest_batch.append(dest_proto)
+      for batch_func in self._batch_convert_functions:
+        batch_func(self, src_batch, dest_batch)
+      yield dest_batch
+
+  def _check_src_type(self, src_proto):
+    """Raises TypeError if src_proto isn't of the pb_class_from type."""
+
     src_type = src_proto.DESCRIPTOR.full_name
     expected_src_type = self._pb_class_from.DESCRIPTOR.full_name
     if src_type != expected_src_type:
@@ -125,80 +821,1384 @@ class ProtoConverter(object):
           f"Provided src_proto type [{src_type}] doesn't match the converter's "
           f"src_proto type [{expected_src_type}].")
 
-    dest_proto = self._pb_class_to()
+  def _auto_convert(self, src_proto, dest_proto):
+    """Auto-converts fields from src_proto to dest_proto."""
 
-    self._auto_convert(src_proto, dest_proto)
-    for user_func in self._convert_functions:
-      user_func(self, src_proto, dest_proto)
+    self._auto_convert_function(src_proto, dest_proto)
 
-    return dest_proto
 
-  def _auto_convert(self, src_proto, dest_proto):
-    """Auto-converts fields from src_proto to dest_proto."""
+class _FieldAction(object):
+  """A pre-selected conversion of one source field into the dest proto.
+
+  Attributes:
+    kind: one of the action kinds, e.g. _SET or _PACK.
+    src_field: the descriptor of the source field.
+    dest_field: the descriptor of the destination field.
+    apply: callable(src_value, dest_proto) performing the conversion.
+  """
+
+  __slots__ = ("kind", "src_field", "dest_field", "apply")
+
+  def __init__(self, kind, src_field, dest_field, apply):
+    self.kind = kind
+    self.src_field = src_field
+    self.dest_field = dest_field
+    self.apply = apply
+
+
+def _build_plan(src_descriptor, dest_descriptor, skipped_field_names,
+                repack_any_resolver=None, nested_plans=None,
+                field_converter_functions=None, renamed_fields=None):
+  """Compiles the auto-conversion plan from src_descriptor to dest_descriptor.
+
+  Args:
+    src_descriptor: the descriptor of the proto to convert from.
+    dest_descriptor: the descriptor of the proto to convert to.
+    skipped_field_names: names of the source fields which are ignored or can't
+      be auto-converted.
+    repack_any_resolver: if set, the _AnyTypeResolver of the repeated Any
+      fields to unpack and pack again.
+    nested_plans: if set, the _NestedPlans converting fields of different
+      proto types.
+    field_converter_functions: field name to the function(src_proto,
+      dest_proto) converting the nested protos of the field, or to the
+      function(src_protos, dest_protos) converting all of them for repeated
+      fields.
+    renamed_fields: source field name to the destination field it's converted
+      to, instead of the field with the same name.
+
+  Returns:
+    A read-only dict from source field number to _FieldAction. Skipped fields
+    have no entry.
+  """
+
+  if field_converter_functions is None:
+    field_converter_functions = {}
+  if renamed_fields is None:
+    renamed_fields = {}
+
+  dest_fields_by_name = dest_descriptor.fields_by_name
+  plan = {}
+  for src_field in src_descriptor.fields:
+    if src_field.name in field_converter_functions:
+      dest_field = dest_fields_by_name[src_field.name]
+      kind = _select_field_converter_action_kind(src_field)
+      function = field_converter_functions[src_field.name]
+      if kind == _CONVERT_REPEATED:
+        apply = _make_apply(kind, src_field, dest_field, convert_many=function)
+      else:
+        apply = _make_apply(kind, src_field, dest_field, convert=function)
+      plan[src_field.number] = _FieldAction(kind, src_field, dest_field, apply)
+      continue
+    if (src_field.name in skipped_field_names and
+        src_field.name not in renamed_fields):
+      continue
+
+    dest_field = (
+        renamed_fields.get(src_field.name) or
+        dest_fields_by_name[src_field.name])
+    kind = _select_action_kind(src_field, dest_field,
+                               repack_any_resolver is not None)
+    plan[src_field.number] = _FieldAction(
+        kind, src_field, dest_field,
+        _make_apply(kind, src_field, dest_field, repack_any_resolver,
+                    nested_plans))
+
+  return types.MappingProxyType(plan)
+
+
+class _PathMapping(object):
+  """A field_mapping entry converting fields at other depths.
+
+  Attributes:
+    src_path: the descriptors of the fields of the source path.
+    dest_path: the descriptors of the fields of the destination path.
+    action: the _FieldAction converting the last field of src_path into the
+      parent proto of the last field of dest_path.
+  """
+
+  __slots__ = ("src_path", "dest_path", "action")
+
+  def __init__(self, src_path, dest_path, action):
+    self.src_path = src_path
+    self.dest_path = dest_path
+    self.action = action
+
+
+def _get_field_path(message_descriptor, path):
+  """Gets the field descriptors of a dotted path of fields, e.g. "box.mochi".
+
+  Args:
+    message_descriptor: the descriptor of the proto the path starts from.
+    path: the dotted field names.
+
+  Returns:
+    The list of field descriptors.
+
+  Raise:
+    ValueError: if a field doesn't exist, or a field followed by another one
+    isn't a singular proto field.
+  """
+
+  fields = []
+  for name in path.split("."):
+    if fields:
+      parent = fields[-1]
+      if (parent.type != descriptor.FieldDescriptor.TYPE_MESSAGE or
+          parent.label == descriptor.FieldDescriptor.LABEL_REPEATED or
+          _is_any_field(parent)):
+        raise ValueError(
+            "Field [{}] of path [{}] must be a singular proto field.".format(
+                parent.name, path))
+      message_descriptor = parent.message_type
+
+    field = message_descriptor.fields_by_name.get(name)
+    if field is None:
+      raise ValueError("Path [{}] has no field [{}] in [{}].".format(
+          path, name, message_descriptor.full_name))
+    fields.append(field)
+
+  return fields
+
+
+def _get_unmapped_field_paths(message_descriptor, prefix, mapped_paths,
+                              ignored_paths):
+  """Gets the paths of the fields of a proto which aren't mapped or ignored.
+
+  Args:
+    message_descriptor: the descriptor of the proto at prefix.
+    prefix: the dotted path of the proto.
+    mapped_paths: the source paths of field_mapping.
+    ignored_paths: the ignored fields and paths.
+
+  Returns:
+    The list of the dotted paths of the fields, where the protos containing
+    mapped fields are replaced by their own unmapped fields.
+  """
+
+  paths = []
+  for field in message_descriptor.fields:
+    path = "{}.{}".format(prefix, field.name)
+    if path in mapped_paths or path in ignored_paths:
+      continue
+    if any(mapped_path.startswith(path + ".") for mapped_path in mapped_paths):
+      paths.extend(
+          _get_unmapped_field_paths(field.message_type, path, mapped_paths,
+                                    ignored_paths))
+    else:
+      paths.append(path)
+
+  return paths
+
+
+class _NestedPlans(object):
+  """Builds the plans of nested protos of different types.
+
+  The plans and their functions are memoized by pair of message types, so
+  protos nested at several places are only compiled once. A pair has a plan
+  only if all the fields of the source proto are auto-convertible, so nested
+  conversion never silently drops data.
+
+  Pairs of recursive message types are converted by step functions, which
+  convert the fields of one proto and push its nested protos on a stack instead
+  of converting them with Python recursion. The step functions are linked to
+  the step functions of their nested pairs by link().
+  """
+
+  def __init__(self, allow_any_unpack=False, repack_any_resolver=None):
+    self._allow_any_unpack = allow_any_unpack
+    self._repack_any_resolver = repack_any_resolver
+    self._convertible = {}
+    self._dependencies = {}
+    self._checked_dependencies = None
+    self._recursive = {}
+    self._plans = {}
+    self._functions = {}
+    self._steps = {}
+    self._unlinked = []
+
+  def is_convertible(self, src_descriptor, dest_descriptor):
+    """Checks if all the fields of the pair are auto-convertible."""
+
+    key = (src_descriptor, dest_descriptor)
+    if self._checked_dependencies is not None:
+      # The fields of another pair are being checked, which is convertible if
+      # this pair is.
+      self._checked_dependencies.append(key)
+      return self._convertible.get(key, True)
+
+    if key not in self._convertible:
+      self._decide(key)
+    return self._convertible[key]
+
+  def _decide(self, key):
+    """Decides if the pairs reachable from the pair are convertible.
+
+    Pairs are assumed to be convertible while their fields are checked, so
+    recursive pairs are convertible unless one of the pairs they depend on
+    isn't. These are removed until none of the remaining pairs depends on a
+    removed one.
+    """
+
+    pending = [key]
+    checked = set()
+    while pending:
+      pair = pending.pop()
+      if pair in checked or pair in self._convertible:
+        continue
+      checked.add(pair)
+      self._checked_dependencies = []
+      try:
+        convertible = self._check_fields(*pair)
+      finally:
+        dependencies = self._checked_dependencies
+        self._checked_dependencies = None
+      self._dependencies[pair] = dependencies
+      if convertible:
+        pending.extend(dependencies)
+      else:
+        self._convertible[pair] = False
+
+    convertible = {pair for pair in checked if pair not in self._convertible}
+    changed = True
+    while changed:
+      changed = False
+      for pair in list(convertible):
+        if any(not self._convertible.get(dependency, dependency in convertible)
+               for dependency in self._dependencies[pair]):
+          convertible.discard(pair)
+          changed = True
+    for pair in checked:
+      self._convertible[pair] = pair in convertible
+
+  def _check_fields(self, src_descriptor, dest_descriptor):
+    if _get_unhandled_fields(src_descriptor.fields,
+                             dest_descriptor.fields_by_name, (),
+                             self._allow_any_unpack, self):
+      return False
+    try:
+      _validate_oneof_field_multi_mapping(src_descriptor, dest_descriptor, ())
+      _validate_oneof_field_multi_mapping(dest_descriptor, src_descriptor, ())
+    except NotImplementedError:
+      return False
+    return True
+
+  def _is_recursive(self, key):
+    """Checks if a cycle of pairs is reachable from the convertible pair."""
+
+    recursive = self._recursive.get(key)
+    if recursive is None:
+      reachable = {key}
+      pending = [key]
+      while pending:
+        for dependency in self._dependencies[pending.pop()]:
+          if dependency not in reachable:
+            reachable.add(dependency)
+            pending.append(dependency)
+
+      # Removes the pairs without dependencies left, which leaves the cycles.
+      changed = True
+      while changed:
+        changed = False
+        for pair in list(reachable):
+          if not any(dependency in reachable
+                     for dependency in self._dependencies[pair]):
+            reachable.discard(pair)
+            changed = True
+      recursive = bool(reachable)
+      self._recursive[key] = recursive
+    return recursive
+
+  def get_plan(self, src_descriptor, dest_descriptor):
+    """Returns the plan of the pair, or None if it isn't auto-convertible."""
+
+    key = (src_descriptor, dest_descriptor)
+    if key not in self._plans:
+      plan = None
+      if self.is_convertible(src_descriptor, dest_descriptor):
+        plan = _build_plan(src_descriptor, dest_descriptor, (),
+                           self._repack_any_resolver, self)
+      self._plans[key] = plan
+    return self._plans[key]
+
+  def get_function(self, src_descriptor, dest_descriptor):
+    """Returns the function(src_proto, dest_proto) converting the pair."""
+
+    key = (src_descriptor, dest_descriptor)
+    function = self._functions.get(key)
+    if function is not None:
+      return function
+
+    if self._is_recursive(key):
+      # The plan of the pair may be under construction, so the step function is
+      # built by link().
+      steps = self._steps
+      self._unlinked.append(key)
+
+      def function(src_proto, dest_proto):
+        _run_steps(src_proto, dest_proto, steps[key])
+    else:
+      function = _make_auto_convert_function(
+          src_descriptor, dest_descriptor,
+          self.get_plan(src_descriptor, dest_descriptor))
+    self._functions[key] = function
+    return function
+
+  def link(self):
+    """Builds and links the step functions of the recursive pairs."""
+
+    links = []
+    while self._unlinked:
+      key = self._unlinked.pop()
+      if key in self._steps:
+        continue
+      step, namespace, nested_pairs = _make_step_function(
+          key[0], key[1], self.get_plan(*key))
+      self._steps[key] = step
+      links.append((namespace, nested_pairs))
+      self._unlinked.extend(nested_pairs.values())
+
+    for namespace, nested_pairs in links:
+      for name, pair in nested_pairs.items():
+        namespace[name] = self._steps[pair]
+
+
+def _make_convert_functions_runner(convert_functions, src_descriptor,
+                                   dest_descriptor):
+  """Returns a function(converter, src_proto, dest_proto) calling the handlers.
+
+  Value handlers, declared with convert_value, are compiled into a single
+  function and called first. Handlers declared with skip_if_absent are only
+  called if one of their fields is set. Each field of these handlers has a bit,
+  and the mask of the set fields is computed with a single ListFields() pass.
+
+  Args:
+    convert_functions: the user convert functions, in calling order.
+    src_descriptor: the descriptor of the proto to convert from.
+    dest_descriptor: the descriptor of the proto to convert to.
+
+  Returns:
+    The function, or None if there are no convert functions.
+
+  Raise:
+    ValueError: if a handler with skip_if_absent has no fields, or fields which
+    aren't in the source proto.
+  """
+
+  value_functions = [
+      function for function in convert_functions
+      if hasattr(function, "convert_value_field_names")
+  ]
+  if not value_functions:
+    return _make_message_functions_runner(convert_functions, src_descriptor)
+
+  run_value_functions = _compile_value_functions(value_functions,
+                                                 src_descriptor,
+                                                 dest_descriptor)
+  run_message_functions = _make_message_functions_runner([
+      function for function in convert_functions
+      if not hasattr(function, "convert_value_field_names")
+  ], src_descriptor)
+  if run_message_functions is None:
+    return run_value_functions
+
+  def run_convert_functions(converter, src_proto, dest_proto):
+    run_value_functions(converter, src_proto, dest_proto)
+    run_message_functions(converter, src_proto, dest_proto)
+
+  return run_convert_functions
+
+
+def _compile_value_functions(value_functions, src_descriptor, dest_descriptor):
+  """Compiles the calls of value handlers into a function.
+
+  The generated function(converter, src_proto, dest_proto) reads each source
+  field, skips it if it isn't set, and assigns the result of its handler to the
+  destination field.
+
+  Args:
+    value_functions: the functions decorated with convert_value.
+    src_descriptor: the descriptor of the proto to convert from.
+    dest_descriptor: the descriptor of the proto to convert to.
+
+  Returns:
+    The generated function.
+
+  Raise:
+    ValueError: if a field of a value handler isn't in its proto.
+  """
+
+  lines = ["def run_value_functions(converter, src_proto, dest_proto):"]
+  namespace = dict(_GENERATED_GLOBALS)
+  for index, function in enumerate(value_functions):
+    src_name, dest_name = function.convert_value_field_names
+    src_field = src_descriptor.fields_by_name.get(src_name)
+    dest_field = dest_descriptor.fields_by_name.get(dest_name)
+    if src_field is None or dest_field is None:
+      raise ValueError(
+          "Value handler {} converts [{}] to [{}], which must be fields of [{}] "
+          "and [{}].".format(function.__name__, src_name, dest_name,
+                             src_descriptor.full_name,
+                             dest_descriptor.full_name))
+
+    function_name = "_value_{}".format(index)
+    namespace[function_name] = function
+    lines.extend("  " + line for line in _generate_value_function_lines(
+        src_field, dest_field, "{}(converter, value)".format(function_name)))
+
+  source = "\n".join(lines) + "\n"
+  filename = "<pyproto value functions {} -> {}>".format(
+      src_descriptor.full_name, dest_descriptor.full_name)
+  exec(compile(source, filename, "exec"), namespace)
+  function = namespace["run_value_functions"]
+  function.source = source
+  return function
+
+
+def _generate_value_function_lines(src_field, dest_field, result):
+  """Generates the statements assigning result if src_field is set."""
+
+  src_value = _attribute_source("src_proto", src_field.name)
+  dest_value = _attribute_source("dest_proto", dest_field.name)
+  if _has_presence(src_field):
+    lines = [
+        "if src_proto.HasField({!r}):".format(src_field.name),
+        "  value = " + src_value,
+    ]
+  else:
+    lines = [
+        "value = " + src_value,
+        "if {}:".format(_presence_condition(src_field)),
+    ]
+
+  if _is_map_field(dest_field):
+    value_field = dest_field.message_type.fields_by_name["value"]
+    if value_field.type == descriptor.FieldDescriptor.TYPE_MESSAGE:
+      lines.extend([
+          "  dest_field = " + dest_value,
+          "  for key, element in {}.items():".format(result),
+          "    dest_field[key].CopyFrom(element)",
+      ])
+    else:
+      lines.append("  {}.update({})".format(dest_value, result))
+  elif dest_field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+    lines.append("  {}.extend({})".format(dest_value, result))
+  elif dest_field.type == descriptor.FieldDescriptor.TYPE_MESSAGE:
+    lines.append("  {}.CopyFrom({})".format(dest_value, result))
+  else:
+    lines.append("  " + _assignment_source("dest_proto", dest_field.name,
+                                           result))
+  return lines
+
+
+def _make_batch_functions_runner(run_unbatched_convert_functions,
+                                 batch_convert_functions):
+  """Returns a function(converter, src_proto, dest_proto) calling all handlers.
+
+  Batch convert functions are called after the other handlers with
+  single-element batches, in the same order as convert_many() calls them.
+
+  Args:
+    run_unbatched_convert_functions: the function calling the other handlers,
+      or None if there are none.
+    batch_convert_functions: the batch convert functions.
+
+  Returns:
+    The function, or None if there are no convert functions.
+  """
+
+  if not batch_convert_functions:
+    return run_unbatched_convert_functions
+
+  def run_convert_functions(converter, src_proto, dest_proto):
+    if run_unbatched_convert_functions is not None:
+      run_unbatched_convert_functions(converter, src_proto, dest_proto)
+    src_protos = [src_proto]
+    dest_protos = [dest_proto]
+    for batch_function in batch_convert_functions:
+      batch_function(converter, src_protos, dest_protos)
+
+  return run_convert_functions
+
+
+def _make_message_functions_runner(convert_functions, src_descriptor):
+  """Returns the runner of the handlers of whole protos, see above."""
+
+  if not convert_functions:
+    return None
+
+  if not any(
+      getattr(function, "skip_if_absent", False)
+      for function in convert_functions):
+
+    def run_convert_functions(converter, src_proto, dest_proto):
+      for user_func in convert_functions:
+        user_func(converter, src_proto, dest_proto)
+
+    return run_convert_functions
+
+  bits = {}
+  masked_functions = []
+  for function in convert_functions:
+    mask = None
+    if getattr(function, "skip_if_absent", False):
+      # The handler would never be called.
+      if not function.convert_field_names:
+        raise ValueError(
+            "Convert function [{}] with skip_if_absent has no field names."
+            .format(function.__name__))
+      mask = 0
+      for field_name in function.convert_field_names:
+        field = src_descriptor.fields_by_name.get(field_name)
+        if field is None:
+          raise ValueError(
+              "Convert function [{}] with skip_if_absent has field [{}], which "
+              "isn't in [{}].".format(function.__name__, field_name,
+                                      src_descriptor.full_name))
+        mask |= bits.setdefault(field.number, 1 << len(bits))
+    masked_functions.append((function, mask))
+  bits_get = bits.get
+
+  def run_masked_convert_functions(converter, src_proto, dest_proto):
+    present = 0
+    for src_field_descriptor, _ in src_proto.ListFields():
+      present |= bits_get(src_field_descriptor.number, 0)
+    for user_func, mask in masked_functions:
+      if mask is None or mask & present:
+        user_func(converter, src_proto, dest_proto)
+
+  return run_masked_convert_functions
+
+
+def _get_wire_mode(pb_class_from, pb_class_to, plan, convert_functions,
+                   path_mapped_field_names=()):
+  """Selects how convert_bytes converts serialized protos.
+
+  Args:
+    pb_class_from: the proto class to convert from.
+    pb_class_to: the proto class to convert to.
+    plan: the compiled plan returned by _build_plan.
+    convert_functions: the user convert functions.
+    path_mapped_field_names: the source fields converted by _PathMapping.
+
+  Returns:
+    _WIRE_PASSTHROUGH, _WIRE_REPARSE, _WIRE_TRANSCODE or _WIRE_CONVERT.
+  """
+
+  # User functions may read any field of the source proto and the fields set
+  # by the auto-conversion, so they get fully converted protos.
+  if convert_functions:
+    return _WIRE_CONVERT
+
+  wire_compatible_actions = [
+      action for action in plan.values()
+      if _is_wire_compatible(action) and
+      action.src_field.name not in path_mapped_field_names
+  ]
+  if not wire_compatible_actions:
+    return _WIRE_CONVERT
+
+  src_fields = pb_class_from.DESCRIPTOR.fields
+  if (len(wire_compatible_actions) != len(src_fields) or
+      any(action.src_field.number != action.dest_field.number
+          for action in wire_compatible_actions)):
+    return _WIRE_TRANSCODE
+
+  if len(pb_class_to.DESCRIPTOR.fields) == len(src_fields):
+    return _WIRE_PASSTHROUGH
+  return _WIRE_REPARSE
+
+
+def _build_tag_table(plan, pb_class_from, path_mapped_field_names=()):
+  """Builds the tag table of wire.transcode for a converter.
+
+  Args:
+    plan: the compiled plan returned by _build_plan.
+    pb_class_from: the proto class to convert from.
+    path_mapped_field_names: the source fields converted by _PathMapping,
+      which are converted from the fallback bytes.
+
+  Returns:
+    (tag table, plan of the fields converted from the fallback bytes).
+  """
+
+  tag_table = {}
+  fallback_plan = {}
+  for src_field in pb_class_from.DESCRIPTOR.fields:
+    action = plan.get(src_field.number)
+    if src_field.name in path_mapped_field_names or (
+        action is not None and not _is_wire_compatible(action)):
+      target = wire.FALLBACK
+      if action is not None:
+        fallback_plan[src_field.number] = action
+    elif action is not None:
+      target = None
+    else:
+      continue
+
+    for wire_type in wire.FIELD_WIRETYPES:
+      if target is wire.FALLBACK:
+        tag_table[wire.make_tag(src_field.number, wire_type)] = target
+      else:
+        tag_table[wire.make_tag(src_field.number, wire_type)] = (
+            wire.encode_varint(
+                wire.make_tag(action.dest_field.number, wire_type)))
+
+  return tag_table, types.MappingProxyType(fallback_plan)
+
+
+def _is_wire_compatible(action):
+  """Checks if the serialized src field can be copied with a new tag."""
+
+  # Groups are closed by a tag with their field number, so they can't be
+  # renumbered by rewriting their start tag only.
+  return (action.kind in (_SET, _COPY, _MERGE) and
+          action.src_field.type != descriptor.FieldDescriptor.TYPE_GROUP)
+
+
+def _select_action_kind(src_field, dest_field, repack_any=False):
+  """Selects how an auto-convertible src_field is copied into dest_field."""
 
+  # Map Case
+  if _is_map_field(src_field):
+    src_map_value_field = src_field.message_type.fields_by_name["value"]
+    dest_map_value_field = dest_field.message_type.fields_by_name["value"]
+    # Map<key, Proto> -> Map<key, Proto> of another type
+    if _is_nested_conversion(src_map_value_field, dest_map_value_field):
+      return _CONVERT_MAP
+    # Map<key, Proto> -> Map<key, Any>
+    if (_is_any_field(dest_map_value_field) and
+        not _is_any_field(src_map_value_field)):
+      return _PACK_MAP
+    # Map<key, Any> -> Map<key, Proto>
+    if (_is_any_field(src_map_value_field) and
+        dest_map_value_field.message_type is not None and
+        not _is_any_field(dest_map_value_field)):
+      return _UNPACK_MAP
+    # Map<key, Any> -> Map<key, Any> and Map<key, Proto> -> Map<key, Proto>
+    return _MERGE
+
+  # Array Case
+  if src_field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+    # Any[] -> Any[], MergeFrom copies the type URLs and values as they are.
+    if _is_any_field(src_field) and _is_any_field(dest_field):
+      return _REPACK_ANY_REPEATED if repack_any else _MERGE
+    # Any[] -> Proto[]
+    if _is_any_field(src_field):
+      return _UNPACK_REPEATED
+    # Proto[] -> Proto[] of another type
+    if _is_nested_conversion(src_field, dest_field):
+      return _CONVERT_REPEATED
+    #  Proto [] -> Any[]
+    if _is_any_field(dest_field):
+      return _PACK_REPEATED
+    return _MERGE
+
+  # Proto Case
+  if src_field.type == descriptor.FieldDescriptor.TYPE_MESSAGE:
+    if _is_any_field(dest_field) and not _is_any_field(src_field):
+      return _PACK
+    if _is_any_field(src_field) and not _is_any_field(dest_field):
+      return _UNPACK
+    if _is_nested_conversion(src_field, dest_field):
+      return _CONVERT
+    return _COPY
+
+  # Other Case
+  return _SET
+
+
+def _select_field_converter_action_kind(src_field):
+  """Selects how a src_field with a field converter is converted."""
+
+  if _is_map_field(src_field):
+    return _CONVERT_MAP
+  if src_field.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+    return _CONVERT_REPEATED
+  return _CONVERT
+
+
+def _get_nested_message_types(src_field, dest_field):
+  """Gets the message types converted by a field converter of the fields.
+
+  Args:
+    src_field: the source field.
+    dest_field: the destination field.
+
+  Returns:
+    (source message type, destination message type) of the fields, or of the
+    values of map fields.
+
+  Raise:
+    ValueError: if the fields don't hold protos, or have different labels or
+    map keys.
+  """
+
+  if (src_field.type != descriptor.FieldDescriptor.TYPE_MESSAGE or
+      dest_field.type != descriptor.FieldDescriptor.TYPE_MESSAGE or
+      src_field.label != dest_field.label or
+      _is_map_field(src_field) != _is_map_field(dest_field)):
+    raise ValueError(
+        "Field converter field [{}] must hold protos in both protos, with the "
+        "same label.".format(src_field.name))
+
+  if not _is_map_field(src_field):
+    return src_field.message_type, dest_field.message_type
+
+  src_fields_by_name = src_field.message_type.fields_by_name
+  dest_fields_by_name = dest_field.message_type.fields_by_name
+  src_value_field = src_fields_by_name["value"]
+  dest_value_field = dest_fields_by_name["value"]
+  if (src_fields_by_name["key"].type != dest_fields_by_name["key"].type or
+      src_value_field.type != descriptor.FieldDescriptor.TYPE_MESSAGE or
+      dest_value_field.type != descriptor.FieldDescriptor.TYPE_MESSAGE):
+    raise ValueError(
+        "Field converter map field [{}] must have the same key type and proto "
+        "values in both protos.".format(src_field.name))
+  return src_value_field.message_type, dest_value_field.message_type
+
+
+def _make_apply(kind, src_field, dest_field, any_type_resolver=None,
+                nested_plans=None, convert=None, convert_many=None):
+  """Returns a callable(src_value, dest_proto) for the action kind.
+
+  Args:
+    kind: the action kind.
+    src_field: the descriptor of the source field.
+    dest_field: the descriptor of the destination field.
+    any_type_resolver: the _AnyTypeResolver of _REPACK_ANY_REPEATED.
+    nested_plans: the _NestedPlans of the _CONVERT kinds.
+    convert: the function(src_proto, dest_proto) converting the nested protos
+      of the _CONVERT kinds, instead of nested_plans.
+    convert_many: the function(src_protos, dest_protos) converting all the
+      nested protos of _CONVERT_REPEATED at once, instead of convert.
+
+  Returns:
+    The callable.
+  """
+
+  dest_field_name = dest_field.name
+  get_dest_field = operator.attrgetter(dest_field_name)
+
+  if kind == _SET:
+
+    def apply(src_field, dest_proto):
+      setattr(dest_proto, dest_field_name, src_field)
+
+  elif kind == _COPY:
+
+    def apply(src_field, dest_proto):
+      get_dest_field(dest_proto).CopyFrom(src_field)
+
+  elif kind == _PACK:
+
+    def apply(src_field, dest_proto):
+      get_dest_field(dest_proto).Pack(src_field)
+
+  elif kind == _MERGE:
+
+    def apply(src_field, dest_proto):
+      get_dest_field(dest_proto).MergeFrom(src_field)
+
+  elif kind == _PACK_REPEATED:
+    type_url = _get_pack_type_url(kind, src_field)
+
+    def apply(src_field, dest_proto):
+      add = get_dest_field(dest_proto).add
+      for field in src_field:
+        add(type_url=type_url, value=field.SerializeToString())
+
+  elif kind == _PACK_MAP:
+    type_url = _get_pack_type_url(kind, src_field)
+
+    def apply(src_field, dest_proto):
+      dest_field = get_dest_field(dest_proto)
+      for key, value in src_field.items():
+        any_proto = dest_field[key]
+        any_proto.type_url = type_url
+        any_proto.value = value.SerializeToString()
+
+  elif kind in (_UNPACK, _UNPACK_REPEATED, _UNPACK_MAP):
+    message_type = dest_field.message_type
+    if kind == _UNPACK_MAP:
+      message_type = message_type.fields_by_name["value"].message_type
+    type_name = message_type.full_name
+    type_url = _DEFAULT_TYPE_URL_PREFIX + type_name
+
+    def check_type(any_proto):
+      # Checks the usual type URL first, e.g. without splitting strings.
+      any_type_url = any_proto.type_url
+      if any_type_url != type_url and any_type_url.split("/")[-1] != type_name:
+        raise TypeError(
+            "Can't unpack Any with type URL [{}] into field [{}] of type [{}]."
+            .format(any_type_url, dest_field_name, type_name))
+
+    if kind == _UNPACK:
+
+      def apply(src_field, dest_proto):
+        check_type(src_field)
+        get_dest_field(dest_proto).ParseFromString(src_field.value)
+
+    elif kind == _UNPACK_REPEATED:
+
+      def apply(src_field, dest_proto):
+        dest_field = get_dest_field(dest_proto)
+        for field in src_field:
+          check_type(field)
+          dest_field.add().ParseFromString(field.value)
+
+    else:
+
+      def apply(src_field, dest_proto):
+        dest_field = get_dest_field(dest_proto)
+        for key, value in src_field.items():
+          check_type(value)
+          dest_field[key].ParseFromString(value.value)
+
+  elif kind == _CONVERT_REPEATED and convert_many is not None:
+
+    def apply(src_field, dest_proto):
+      add = get_dest_field(dest_proto).add
+      src_protos = list(src_field)
+      convert_many(src_protos, [add() for _ in src_protos])
+
+  elif kind in _NESTED_KINDS:
+    if convert is None:
+      convert = nested_plans.get_function(
+          *_get_nested_message_types(src_field, dest_field))
+
+    if kind == _CONVERT:
+
+      def apply(src_field, dest_proto):
+        dest_field = get_dest_field(dest_proto)
+        dest_field.SetInParent()
+        convert(src_field, dest_field)
+
+    elif kind == _CONVERT_REPEATED:
+
+      def apply(src_field, dest_proto):
+        add = get_dest_field(dest_proto).add
+        for field in src_field:
+          convert(field, add())
+
+    else:
+
+      def apply(src_field, dest_proto):
+        dest_field = get_dest_field(dest_proto)
+        for key, value in src_field.items():
+          convert(value, dest_field[key])
+
+  elif kind == _REPACK_ANY_REPEATED:
+
+    def apply(src_field, dest_proto):
+      _repack_any_repeated(src_field, get_dest_field(dest_proto),
+                           any_type_resolver)
+
+  else:
+    raise ValueError("Unknown field action kind: {}.".format(kind))
+
+  return apply
+
+
+def _get_pack_type_url(kind, src_field):
+  """Returns the type URL of the Any values packed from src_field.
+
+  All the elements of a repeated or map field have the same type, so the type
+  URL is computed once per field instead of by Pack() for each element.
+  """
+
+  message_type = src_field.message_type
+  if kind == _PACK_MAP:
+    message_type = message_type.fields_by_name["value"].message_type
+  return _DEFAULT_TYPE_URL_PREFIX + message_type.full_name
+
+
+def _make_auto_convert_function(src_descriptor, dest_descriptor, plan,
+                                path_mappings=()):
+  """Returns the function(src_proto, dest_proto) applying plan."""
+
+  if _count_presence_checks(plan) <= _MAX_GENERATED_ACTIONS:
+    return _compile_auto_convert_function(src_descriptor, dest_descriptor, plan,
+                                          path_mappings)
+
+  interpret_plan = _make_plan_interpreter(plan)
+  if not path_mappings:
+    return interpret_plan
+  convert_paths = _compile_auto_convert_function(src_descriptor,
+                                                 dest_descriptor, {},
+                                                 path_mappings)
+
+  def auto_convert(src_proto, dest_proto):
+    interpret_plan(src_proto, dest_proto)
+    convert_paths(src_proto, dest_proto)
+
+  return auto_convert
+
+
+def _count_presence_checks(plan):
+  """Counts the presence checks of the function generated for plan."""
+
+  oneof_dispatch = _get_oneof_dispatch(plan)
+  return len(plan) - sum(len(cases) - 1 for cases in oneof_dispatch.values())
+
+
+def _get_oneof_dispatch(plan):
+  """Gets the planned actions of oneofs, dispatched with a single WhichOneof.
+
+  Args:
+    plan: the compiled plan returned by _build_plan.
+
+  Returns:
+    Oneof descriptor to case name to the apply function of the case, for the
+    oneofs with more than one planned field. Proto3 optional fields are in
+    oneofs of their own, which are checked with HasField instead.
+  """
+
+  actions_by_oneof = {}
+  for action in plan.values():
+    oneof = action.src_field.containing_oneof
+    if oneof is not None:
+      actions_by_oneof.setdefault(oneof, []).append(action)
+
+  return {
+      oneof: {action.src_field.name: action.apply for action in actions}
+      for oneof, actions in actions_by_oneof.items()
+      if len(actions) > 1
+  }
+
+
+def _make_step_function(src_descriptor, dest_descriptor, plan):
+  """Returns the step function of plan, for _run_steps.
+
+  A step function(src_proto, dest_proto, push) converts the fields of plan,
+  except nested protos converted by _NestedPlans, which are pushed as (nested
+  src_proto, nested dest_proto, step function) instead.
+
+  Args:
+    src_descriptor: the descriptor of the proto to convert from.
+    dest_descriptor: the descriptor of the proto to convert to.
+    plan: the compiled plan returned by _build_plan.
+
+  Returns:
+    (the step function, the namespace to link the step functions of the nested
+    pairs into, name in the namespace to the nested pair).
+  """
+
+  nested_pairs = {}
+  if len(plan) <= _MAX_GENERATED_ACTIONS:
+    source = _generate_step_source("step", plan)
+    filename = "<pyproto step {} -> {}>".format(src_descriptor.full_name,
+                                                 dest_descriptor.full_name)
+    namespace = dict(_GENERATED_GLOBALS)
+    for number, action in plan.items():
+      if action.kind in _NESTED_KINDS:
+        nested_pairs["_step_{}".format(number)] = _get_nested_message_types(
+            action.src_field, action.dest_field)
+      else:
+        namespace["_apply_{}".format(number)] = action.apply
+    exec(compile(source, filename, "exec"), namespace)
+    function = namespace["step"]
+    function.source = source
+    return function, namespace, nested_pairs
+
+  actions, sparse_actions = _build_field_number_table(plan)
+  size = len(actions)
+  sparse_actions_get = sparse_actions.get
+  nested_steps = {}
+  for number, action in plan.items():
+    if action.kind in _NESTED_KINDS:
+      nested_pairs[number] = _get_nested_message_types(action.src_field,
+                                                       action.dest_field)
+
+  def step(src_proto, dest_proto, push):
     for src_field_descriptor, src_field in src_proto.ListFields():
-      if (src_field_descriptor.name in self._field_names_to_ignore or
-          src_field_descriptor.name in self._unconverted_fields):
+      number = src_field_descriptor.number
+      action = actions[number] if number < size else sparse_actions_get(number)
+      if action is None:
+        continue
+      if action.kind not in _NESTED_KINDS:
+        action.apply(src_field, dest_proto)
         continue
 
-      dest_field_descriptor = dest_proto.DESCRIPTOR.fields_by_name[
-          src_field_descriptor.name]
-      dest_field = getattr(dest_proto, src_field_descriptor.name)
-
-      # Map Case
-      if _is_map_field(src_field_descriptor):
-        src_map_value_field_descriptor = (
-            src_field_descriptor.message_type.fields_by_name["value"])
-        dest_map_value_field_descriptor = (
-            dest_field_descriptor.message_type.fields_by_name["value"])
-        # Map<key, Proto> -> Map<key, Any>
-        if (_is_any_field(dest_map_value_field_descriptor) and
-            not _is_any_field(src_map_value_field_descriptor)):
-          for key, value in src_field.items():
-            dest_field[key].Pack(value)
-
-        # Map<key, Any> -> Map<key, Any> and Map<key, Proto> -> Map<key, Proto>
-        else:
-          dest_field.MergeFrom(src_field)
-
-      # Array Case
-      elif (src_field_descriptor.label ==
-            descriptor.FieldDescriptor.LABEL_REPEATED):
-        # Any[] -> Any[], MergeFrom doesn't work for Any[]
-        # Any[] -> Proto[] shouldn't happen
-        if _is_any_field(src_field_descriptor):
-          factory = symbol_database.Default()
-          for field in src_field:
-            type_name = field.TypeName()
-            proto_descriptor = factory.pool.FindMessageTypeByName(type_name)
-            proto_class = factory.GetPrototype(proto_descriptor)
-            proto_object = proto_class()
-            field.Unpack(proto_object)
-            dest_field.add().Pack(proto_object)
-        #  Proto [] -> Any[]
-        elif _is_any_field(dest_field_descriptor):
-          for field in src_field:
-            any_proto = any_pb2.Any()
-            any_proto.Pack(field)
-            dest_field.append(any_proto)
-        else:
-          dest_field.MergeFrom(src_field)
-
-      # Proto Case
-      elif src_field_descriptor.type == descriptor.FieldDescriptor.TYPE_MESSAGE:
-        if _is_any_field(
-            dest_field_descriptor) and not _is_any_field(src_field_descriptor):
-          dest_field.Pack(src_field)
-        else:
-          dest_field.CopyFrom(src_field)
-
-      # Other Case
+      nested_step = nested_steps[number]
+      dest_field = getattr(dest_proto, action.dest_field.name)
+      if action.kind == _CONVERT:
+        dest_field.SetInParent()
+        push((src_field, dest_field, nested_step))
+      elif action.kind == _CONVERT_REPEATED:
+        for field in src_field:
+          push((field, dest_field.add(), nested_step))
       else:
-        setattr(dest_proto, src_field_descriptor.name, src_field)
+        for key, value in src_field.items():
+          push((value, dest_field[key], nested_step))
+
+  return step, nested_steps, nested_pairs
+
+
+def _run_steps(src_proto, dest_proto, step):
+  """Converts src_proto into dest_proto with an explicit stack of steps."""
+
+  stack = [(src_proto, dest_proto, step)]
+  push = stack.append
+  pop = stack.pop
+  while stack:
+    src_proto, dest_proto, step = pop()
+    step(src_proto, dest_proto, push)
+
+
+def _make_plan_interpreter(plan):
+  """Returns a function(src_proto, dest_proto) applying plan to ListFields()."""
+
+  applies, sparse_applies = _build_field_number_table(
+      {number: action.apply for number, action in plan.items()})
+  size = len(applies)
+  sparse_applies_get = sparse_applies.get
+
+  def auto_convert(src_proto, dest_proto):
+    for src_field_descriptor, src_field in src_proto.ListFields():
+      number = src_field_descriptor.number
+      apply = applies[number] if number < size else sparse_applies_get(number)
+      if apply is not None:
+        apply(src_field, dest_proto)
+
+  return auto_convert
+
+
+def _build_field_number_table(entries):
+  """Builds a table of field number to entry, e.g. a planned action.
+
+  Field numbers are usually small and dense, so they index a list, which is
+  faster than hashing them. Numbers above _MAX_DENSE_FIELD_NUMBER are kept in a
+  dict instead, so a few large numbers don't make the list huge.
+
+  Args:
+    entries: field number to entry.
+
+  Returns:
+    (list of the entries indexed by field number, None for missing numbers,
+    dict of the entries whose number is past the end of the list).
+  """
+
+  size = min(max(entries, default=0), _MAX_DENSE_FIELD_NUMBER) + 1
+  dense_entries = [None] * size
+  sparse_entries = {}
+  for number, entry in entries.items():
+    if number < size:
+      dense_entries[number] = entry
+    else:
+      sparse_entries[number] = entry
+  return dense_entries, sparse_entries
+
+
+def _repack_any_repeated(src_field, dest_field, any_type_resolver):
+  """Copies the Any[] src_field into the Any[] dest_field."""
+
+  resolve = any_type_resolver.resolve
+  for field in src_field:
+    proto_object = resolve(field.type_url)()
+    field.Unpack(proto_object)
+    dest_field.add().Pack(proto_object)
+
+
+class _AnyTypeResolver(object):
+  """Resolves Any type URLs to message classes.
+
+  The classes are cached by type URL, including unknown types, so the pool is
+  only searched once per type. The cache is bounded and evicts the oldest
+  type URLs first.
+  """
+
+  def __init__(self, pool=None, maxsize=_MAX_RESOLVED_ANY_TYPES):
+    self._pool = pool or descriptor_pool_lib.Default()
+    self._maxsize = maxsize
+    self._classes = {}
+
+  def resolve(self, type_url):
+    """Returns the message class of type_url.
+
+    Args:
+      type_url: the type URL of an Any proto.
+
+    Returns:
+      The message class.
+
+    Raises:
+      TypeError: if the type isn't in the pool.
+    """
+
+    try:
+      proto_class = self._classes[type_url]
+    except KeyError:
+      proto_class = self._find_class(type_url)
+      if len(self._classes) >= self._maxsize:
+        try:
+          del self._classes[next(iter(self._classes))]
+        except (KeyError, RuntimeError, StopIteration):
+          # Another thread changed the cache.
+          pass
+      self._classes[type_url] = proto_class
+
+    if proto_class is None:
+      raise TypeError(
+          "Can't resolve the type of Any with type URL [{}].".format(type_url))
+    return proto_class
+
+  def _find_class(self, type_url):
+    type_name = type_url.split("/")[-1]
+    try:
+      proto_descriptor = self._pool.FindMessageTypeByName(type_name)
+    except KeyError:
+      return None
+    return _get_message_class(proto_descriptor)
+
+
+def _get_message_class(message_descriptor):
+  """Returns the message class of message_descriptor."""
+
+  if hasattr(message_factory, "GetMessageClass"):
+    return message_factory.GetMessageClass(message_descriptor)
+  # Older protobuf releases don't have GetMessageClass.
+  return message_factory.MessageFactory(
+      message_descriptor.file.pool).GetPrototype(message_descriptor)
+
+
+def _compile_auto_convert_function(src_descriptor, dest_descriptor, plan,
+                                   path_mappings=()):
+  """Compiles plan into a specialized function(src_proto, dest_proto).
+
+  The generated function has one statement per planned field, with presence
+  checks inlined, so no ListFields() iteration or per-field dispatch is done.
+
+  Args:
+    src_descriptor: the descriptor of the proto to convert from.
+    dest_descriptor: the descriptor of the proto to convert to.
+    plan: the compiled plan returned by _build_plan.
+    path_mappings: the _PathMapping to convert after plan.
+
+  Returns:
+    The generated function.
+  """
+
+  source = _generate_auto_convert_source("auto_convert", plan, path_mappings)
+  filename = "<pyproto auto_convert {} -> {}>".format(
+      src_descriptor.full_name, dest_descriptor.full_name)
+  namespace = dict(_GENERATED_GLOBALS)
+  for number, action in plan.items():
+    namespace["_apply_{}".format(number)] = action.apply
+  for oneof, cases in _get_oneof_dispatch(plan).items():
+    namespace["_oneof_{}".format(oneof.index)] = cases
+  for index, mapping in enumerate(path_mappings):
+    namespace["_mapping_{}".format(index)] = mapping.action.apply
+  exec(compile(source, filename, "exec"), namespace)
+  function = namespace["auto_convert"]
+  function.source = source
+  return function
+
+
+def _generate_auto_convert_source(function_name, plan, path_mappings=()):
+  """Generates the source of a function applying plan to a pair of protos."""
+
+  oneof_dispatch = _get_oneof_dispatch(plan)
+  dispatched_oneofs = set()
+  lines = ["def {}(src_proto, dest_proto):".format(function_name)]
+  for number in sorted(plan):
+    action = plan[number]
+    oneof = action.src_field.containing_oneof
+    if oneof not in oneof_dispatch:
+      action_lines = _generate_action_lines(action)
+    elif oneof not in dispatched_oneofs:
+      dispatched_oneofs.add(oneof)
+      action_lines = _generate_oneof_dispatch_lines(oneof)
+    else:
+      continue
+    lines.extend("  " + line for line in action_lines)
+  for index, mapping in enumerate(path_mappings):
+    lines.extend("  " + line
+                 for line in _generate_path_mapping_lines(index, mapping))
+  if len(lines) == 1:
+    lines.append("  pass")
+
+  return "\n".join(lines) + "\n"
+
+
+def _generate_path_mapping_lines(index, mapping):
+  """Generates the statements converting a _PathMapping.
+
+  The source path is read if all its protos are set, and the destination
+  protos are created by the assignment of the last field.
+  """
+
+  lines = []
+  indent = ""
+  src_proto = "src_proto"
+  for field in mapping.src_path[:-1]:
+    lines.append("{}if {}.HasField({!r}):".format(indent, src_proto,
+                                                  field.name))
+    src_proto = _attribute_source(src_proto, field.name)
+    indent += "  "
+  dest_proto = "dest_proto"
+  for field in mapping.dest_path[:-1]:
+    dest_proto = _attribute_source(dest_proto, field.name)
+
+  src_field = mapping.src_path[-1]
+  src_value = _attribute_source(src_proto, src_field.name)
+  if _has_presence(src_field):
+    lines.append("{}if {}.HasField({!r}):".format(indent, src_proto,
+                                                  src_field.name))
+  else:
+    lines.append("{}value = {}".format(indent, src_value))
+    lines.append("{}if {}:".format(indent, _presence_condition(src_field)))
+    src_value = "value"
+  lines.append("{}  _mapping_{}({}, {})".format(indent, index, src_value,
+                                                dest_proto))
+  return lines
+
+
+def _generate_step_source(function_name, plan):
+  """Generates the source of the step function of plan."""
+
+  lines = ["def {}(src_proto, dest_proto, push):".format(function_name)]
+  for number in sorted(plan):
+    action = plan[number]
+    if action.kind in _NESTED_KINDS:
+      action_lines = _generate_push_lines(action)
+    else:
+      action_lines = _generate_action_lines(action)
+    lines.extend("  " + line for line in action_lines)
+  if len(lines) == 1:
+    lines.append("  pass")
+
+  return "\n".join(lines) + "\n"
+
+
+def _generate_oneof_dispatch_lines(oneof):
+  """Generates the statements converting the case of a dispatched oneof."""
+
+  return [
+      "case = src_proto.WhichOneof({!r})".format(oneof.name),
+      "if case is not None:",
+      "  apply = _oneof_{}.get(case)".format(oneof.index),
+      "  if apply is not None:",
+      "    apply(getattr(src_proto, case), dest_proto)",
+  ]
+
+
+def _generate_push_lines(action):
+  """Generates the statements pushing the nested protos of a field."""
+
+  src_name = action.src_field.name
+  src_value = _attribute_source("src_proto", src_name)
+  dest_value = _attribute_source("dest_proto", action.dest_field.name)
+  step = "_step_{}".format(action.src_field.number)
+  if action.kind == _CONVERT:
+    return [
+        "if src_proto.HasField({!r}):".format(src_name),
+        "  dest_field = " + dest_value,
+        "  dest_field.SetInParent()",
+        "  push(({}, dest_field, {}))".format(src_value, step),
+    ]
+  if action.kind == _CONVERT_REPEATED:
+    return [
+        "value = " + src_value,
+        "if value:",
+        "  add = {}.add".format(dest_value),
+        "  for element in value:",
+        "    push((element, add(), {}))".format(step),
+    ]
+  return [
+      "value = " + src_value,
+      "if value:",
+      "  dest_field = " + dest_value,
+      "  for key, element in value.items():",
+      "    push((element, dest_field[key], {}))".format(step),
+  ]
+
+
+def _generate_action_lines(action):
+  """Generates the statements converting a single planned field."""
+
+  src_name = action.src_field.name
+  src_value = _attribute_source("src_proto", src_name)
+  dest_value = _attribute_source("dest_proto", action.dest_field.name)
+  kind = action.kind
+
+  if kind == _SET:
+    if _has_presence(action.src_field):
+      return [
+          "if src_proto.HasField({!r}):".format(src_name),
+          "  " + _assignment_source("dest_proto", action.dest_field.name,
+                                    src_value),
+      ]
+    return [
+        "value = " + src_value,
+        "if {}:".format(_presence_condition(action.src_field)),
+        "  " + _assignment_source("dest_proto", action.dest_field.name,
+                                  "value"),
+    ]
+
+  if kind in (_UNPACK, _CONVERT):
+    return [
+        "if src_proto.HasField({!r}):".format(src_name),
+        "  _apply_{}({}, dest_proto)".format(action.src_field.number,
+                                             src_value),
+    ]
+
+  if kind in (_COPY, _PACK):
+    method = "CopyFrom" if kind == _COPY else "Pack"
+    return [
+        "if src_proto.HasField({!r}):".format(src_name),
+        "  {}.{}({})".format(dest_value, method, src_value),
+    ]
+
+  lines = ["value = " + src_value, "if value:"]
+  if kind == _MERGE:
+    lines.append("  {}.MergeFrom(value)".format(dest_value))
+  elif kind == _PACK_REPEATED:
+    type_url = _get_pack_type_url(kind, action.src_field)
+    lines.extend([
+        "  add = {}.add".format(dest_value),
+        "  for element in value:",
+        "    add(type_url={!r}, value=element.SerializeToString())".format(
+            type_url),
+    ])
+  elif kind == _PACK_MAP:
+    type_url = _get_pack_type_url(kind, action.src_field)
+    lines.extend([
+        "  dest_field = " + dest_value,
+        "  for key, element in value.items():",
+        "    any_proto = dest_field[key]",
+        "    any_proto.type_url = {!r}".format(type_url),
+        "    any_proto.value = element.SerializeToString()",
+    ])
+  elif kind in (_REPACK_ANY_REPEATED, _UNPACK_REPEATED, _UNPACK_MAP,
+                _CONVERT_REPEATED, _CONVERT_MAP):
+    lines.append("  _apply_{}(value, dest_proto)".format(
+        action.src_field.number))
+  else:
+    raise ValueError("Unknown field action kind: {}.".format(kind))
+
+  return lines
+
+
+def _attribute_source(obj, name):
+  """Returns the source reading the attribute name from obj."""
+
+  if keyword.iskeyword(name):
+    return "getattr({}, {!r})".format(obj, name)
+  return "{}.{}".format(obj, name)
+
+
+def _assignment_source(obj, name, value):
+  """Returns the source assigning value to the attribute name of obj."""
+
+  if keyword.iskeyword(name):
+    return "setattr({}, {!r}, {})".format(obj, name, value)
+  return "{}.{} = {}".format(obj, name, value)
 
 
 def _get_unhandled_fields(src_proto_fields, dest_proto_fields_by_name,
-                          field_names_to_ignore):
+                          field_names_to_ignore, allow_any_unpack=False,
+                          nested_plans=None):
   """Gets a list of unconverted fields from src to dest."""
 
   unhandled_field_names = []
@@ -206,14 +2206,17 @@ def _get_unhandled_fields(src_proto_fields, dest_proto_fields_by_name,
     if field.name in field_names_to_ignore:
       continue
 
-    if not _is_src_field_auto_convertible(field, dest_proto_fields_by_name):
+    if not _is_src_field_auto_convertible(field, dest_proto_fields_by_name,
+                                          allow_any_unpack, nested_plans):
       unhandled_field_names.append(field.name)
 
   return unhandled_field_names
 
 
 def _is_src_field_auto_convertible(src_field,
-                                   dest_proto_fields_by_name) -> bool:
+                                   dest_proto_fields_by_name,
+                                   allow_any_unpack=False,
+                                   nested_plans=None) -> bool:
   """Checks if the src_field can be auto-converted.
 
   There must be a field in dest_proto with same name and type as the src_field
@@ -222,6 +2225,10 @@ def _is_src_field_auto_convertible(src_field,
   Args:
     src_field: the field to check if it's auto-convertible.
     dest_proto_fields_by_name: field name to field dict for dest_proto.
+    allow_any_unpack: if True, Any fields are auto-convertible to other protos,
+      and their type is checked when converting.
+    nested_plans: if set, the _NestedPlans deciding if protos of different
+      types are auto-convertible.
 
   Returns:
     bool: True if the src_field is auto-convertible.
@@ -243,24 +2250,26 @@ def _is_src_field_auto_convertible(src_field,
     if (not _is_src_field_auto_convertible(src_fields_by_name["key"],
                                            dest_fields_by_name) or
         not _is_src_field_auto_convertible(src_fields_by_name["value"],
-                                           dest_fields_by_name)):
+                                           dest_fields_by_name,
+                                           allow_any_unpack, nested_plans)):
       return False
   elif src_field.type == descriptor.FieldDescriptor.TYPE_MESSAGE:
     # Any -> Any will always be valid
     if _is_any_field(src_field) and _is_any_field(dest_field):
       return True
 
-    # Disable Any -> Proto convert since we can't check
+    # Disable Any -> Proto convert by default since we can't check
     # whether it's convertible until runtime.
     if _is_any_field(src_field):
-      return False
+      return allow_any_unpack
 
     # Proto -> Any will always be convertible as long as the field_name matches
     if _is_any_field(dest_field):
       return True
 
     if src_field.message_type != dest_field.message_type:
-      return False
+      return (nested_plans is not None and nested_plans.is_convertible(
+          src_field.message_type, dest_field.message_type))
 
   return True
 
@@ -269,24 +2278,34 @@ def _validate_oneof_field_multi_mapping(src_pb, dest_pb, ignored_fields):
   """Validates if the oneof field on src_pb maps to multiple fields.
 
   Args:
-    src_pb: the proto to check oneof from.
-    dest_pb: the proto to check oneof against.
+    src_pb: the descriptor of the proto to check oneof from.
+    dest_pb: the descriptor of the proto to check oneof against.
     ignored_fields: fields that skip the check.
   Exception: Raises NotImplementedError if any oneof field in src_pb maps to
     multiple fields from dest_pb.
   """
 
-  ignored_fields_set = set(ignored_fields)
-  src_oneof_names_dict = src_pb.DESCRIPTOR.oneofs_by_name
+  src_oneof_name = _find_oneof_field_multi_mapping(src_pb, dest_pb,
+                                                   frozenset(ignored_fields))
+  if src_oneof_name is not None:
+    raise NotImplementedError(
+        "Oneof field {} in proto {} maps to more than one field, all fields in the "
+        "oneof must be explicitly handled or ignored.".format(
+            src_oneof_name, src_pb.name))
 
-  dest_oneof_dict = _get_fields_to_oneof_dict(dest_pb.DESCRIPTOR.oneofs_by_name)
-  dest_field_names = set(dest_pb.DESCRIPTOR.fields_by_name.keys())
 
-  for src_oneof_name, src_oneof_field in src_oneof_names_dict.items():
+@functools.lru_cache(maxsize=_MAX_VALIDATED_ONEOF_PAIRS)
+def _find_oneof_field_multi_mapping(src_pb, dest_pb, ignored_fields):
+  """Returns the name of a src_pb oneof mapping to multiple fields, or None."""
+
+  dest_oneof_dict = _get_fields_to_oneof_dict(dest_pb)
+  dest_field_names = dest_pb.fields_by_name
+
+  for src_oneof_name, src_oneof_field in src_pb.oneofs_by_name.items():
     mapped_field = set()
     for src_field in src_oneof_field.fields:
       src_field_name = src_field.name
-      if src_field_name in ignored_fields_set:
+      if src_field_name in ignored_fields:
         continue
 
       if src_field_name in dest_oneof_dict:
@@ -295,26 +2314,31 @@ def _validate_oneof_field_multi_mapping(src_pb, dest_pb, ignored_fields):
         mapped_field.add(src_field_name)
 
     if len(mapped_field) > 1:
-      raise NotImplementedError(
-          "Oneof field {} in proto {} maps to more than one field, all fields in the "
-          "oneof must be explicitly handled or ignored.".format(
-              src_oneof_name, src_pb.DESCRIPTOR.name))
+      return src_oneof_name
 
+  return None
 
-def _get_fields_to_oneof_dict(oneof_by_name):
+
+@functools.lru_cache(maxsize=_MAX_VALIDATED_ONEOF_PAIRS)
+def _get_fields_to_oneof_dict(message_descriptor):
   result_dict = {}
-  for name, oneof_field in oneof_by_name.items():
+  for name, oneof_field in message_descriptor.oneofs_by_name.items():
     for field in oneof_field.fields:
       result_dict[field.name] = name
 
   return result_dict
 
 
-def convert_field(field_names: Optional[List[str]] = None):
+def convert_field(field_names: Optional[List[str]] = None,
+                  skip_if_absent: bool = False):
   """Decorator that converts proto fields.
 
   Args:
     field_names: list of field names from src proto this function handles.
+    skip_if_absent: if True, the function is only called if at least one of the
+      fields is set in the src proto, e.g. has a non-default value for fields
+      without presence. field_names must then be non-empty fields of the src
+      proto, or the converter raises ValueError.
 
   Returns:
     convert_field_decorator
@@ -331,6 +2355,7 @@ def convert_field(field_names: Optional[List[str]] = None):
 
   def convert_field_decorator(convert_method):
     convert_method.convert_field_names = field_names
+    convert_method.skip_if_absent = skip_if_absent
 
     @functools.wraps(convert_method)
     def convert_field_wrapper(self, src_proto, dest_proto):
@@ -341,9 +2366,114 @@ def convert_field(field_names: Optional[List[str]] = None):
   return convert_field_decorator
 
 
+def convert_value(field_name: str, to: Optional[str] = None):
+  """Decorator that converts the value of a proto field.
+
+  The function takes the value of the src field and returns the value of the
+  dest field. It's only called if the src field is set, and its result is
+  assigned, copied or appended to the dest field by the converter.
+
+  Args:
+    field_name: the name of the src field this function handles.
+    to: the name of the dest field, field_name if None.
+
+  Returns:
+    convert_value_decorator
+
+  Typical usage example:
+
+    @converter.convert_value("price", to="price")
+    def price_convert_function(self, price):
+      return int(price)
+  """
+
+  def convert_value_decorator(convert_method):
+    convert_method.convert_field_names = [field_name]
+    convert_method.convert_value_field_names = (field_name, to or field_name)
+    return convert_method
+
+  return convert_value_decorator
+
+
+def convert_field_batch(field_names: Optional[List[str]] = None):
+  """Decorator that converts proto fields of batches of protos.
+
+  The function is called with the list of src protos and the list of their
+  dest protos, after the other conversions of the protos. convert_many() calls
+  it once per batch, while convert() calls it with single-element lists. As a
+  field converter, it's called once with all the protos of a repeated field.
+
+  Args:
+    field_names: list of field names from src proto this function handles.
+
+  Returns:
+    convert_field_batch_decorator
+
+  Typical usage example:
+
+    @converter.convert_field_batch(field_names=["price"])
+    def price_convert_function(self, src_protos, dest_protos):
+      ...
+  """
+
+  if field_names is None:
+    field_names = []
+
+  def convert_field_batch_decorator(convert_method):
+    convert_method.convert_field_names = field_names
+
+    @functools.wraps(convert_method)
+    def convert_field_wrapper(self, src_proto, dest_proto):
+      convert_method(self, [src_proto], [dest_proto])
+
+    convert_field_wrapper.convert_batch_function = convert_method
+    return convert_field_wrapper
+
+  return convert_field_batch_decorator
+
+
+def _is_nested_conversion(src_field, dest_field) -> bool:
+  """Checks if the fields hold protos of different types, none being Any."""
+
+  return (src_field.type == descriptor.FieldDescriptor.TYPE_MESSAGE and
+          src_field.message_type != dest_field.message_type and
+          not _is_any_field(src_field) and not _is_any_field(dest_field))
+
+
 def _is_any_field(field_descriptor) -> bool:
-  return (field_descriptor.message_type ==
-          any_pb2.DESCRIPTOR.message_types_by_name["Any"])
+  # Descriptors of other pools, e.g. of descriptor sets, have their own Any.
+  return (field_descriptor.message_type is not None and
+          field_descriptor.message_type.full_name ==
+          any_pb2.Any.DESCRIPTOR.full_name)
+
+
+def _presence_condition(field_descriptor) -> str:
+  """Returns the source checking if `value` of field_descriptor is set.
+
+  For fields without presence, which are set if they have a non-default value.
+  The source uses the names of _GENERATED_GLOBALS.
+  """
+
+  if field_descriptor.cpp_type in (descriptor.FieldDescriptor.CPPTYPE_FLOAT,
+                                   descriptor.FieldDescriptor.CPPTYPE_DOUBLE):
+    # -0.0 is falsy but still set.
+    return "value or _copysign(1.0, value) < 0.0"
+  return "value"
+
+
+def _has_presence(field_descriptor) -> bool:
+  """Checks if field_descriptor tracks presence, e.g. supports HasField."""
+
+  has_presence = getattr(field_descriptor, "has_presence", None)
+  if has_presence is not None:
+    return has_presence
+
+  # Older protobuf releases don't expose has_presence.
+  if field_descriptor.label == descriptor.FieldDescriptor.LABEL_REPEATED:
+    return False
+  return (field_descriptor.type == descriptor.FieldDescriptor.TYPE_MESSAGE or
+          field_descriptor.containing_oneof is not None or
+          field_descriptor.file.syntax == "proto2")
 
 
 def _is_map_field(field_descriptor) -> bool:
@@ -0,0 +1,275 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Multiprocess conversion of large batches of protos.
+
+Conversion is pure Python and bound by the GIL, so large batches are converted
+in a pool of processes. The protos are sent to the processes in serialized
+chunks, and each process rebuilds the converter once when it starts.
+
+Chunks are pickled to the processes by default. With the "shared_memory"
+transport, the serialized protos are instead packed into a shared memory
+segment with an offset table. The processes read their chunks from it without
+copying and write the results into a second shared segment, so only offsets are
+pickled.
+
+  Typical usage example:
+
+  converter = ProtoConverter(
+        pb_class_from=proto1_pb2.Proto1,
+        pb_class_to=proto2_pb2.Proto2)
+  proto2s = converter.convert_parallel(proto1s, workers=8)
+"""
+
+import array
+from concurrent import futures
+import itertools
+from typing import Any, Iterable, List, Optional
+
+try:
+  from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+  shared_memory = None
+
+DEFAULT_CHUNK_SIZE = 1000
+
+PICKLE = "pickle"
+SHARED_MEMORY = "shared_memory"
+
+# Format of the offset and length tables in shared memory.
+_TABLE_TYPECODE = "q"
+_TABLE_ITEM_SIZE = array.array(_TABLE_TYPECODE).itemsize
+
+# The output space reserved in shared memory for a chunk, relative to its input
+# size. Results which don't fit are pickled instead.
+_OUTPUT_SIZE_FACTOR = 2
+_OUTPUT_SIZE_PER_RECORD = 64
+
+# The converter of the current worker process, set by _init_worker.
+_worker_converter = None
+
+
+def convert_parallel(converter: Any,
+                     src_protos: Iterable[Any],
+                     workers: Optional[int] = None,
+                     chunk_size: int = DEFAULT_CHUNK_SIZE,
+                     ordered: bool = True,
+                     serialized: bool = False,
+                     transport: str = PICKLE) -> List[Any]:
+  """Converts a batch of protos in a pool of processes.
+
+  Args:
+    converter: the ProtoConverter. It's pickled once per process, so user
+      attributes of converter subclasses must be picklable.
+    src_protos: the pb_class_from protos to convert, or their serializations.
+    workers: the number of processes, defaults to the number of CPUs.
+    chunk_size: the number of protos sent to a process at once.
+    ordered: if True, the results are in the order of src_protos. Otherwise
+      the chunks are returned as soon as they are converted.
+    serialized: if True, returns the serialized pb_class_to protos instead of
+      parsing them.
+    transport: PICKLE or SHARED_MEMORY, how chunks are sent to the processes.
+      SHARED_MEMORY requires Python 3.8.
+
+  Returns:
+    The converted protos, or their serializations if serialized is True.
+  """
+
+  if chunk_size < 1:
+    raise ValueError("chunk_size must be positive, got {}.".format(chunk_size))
+  if transport not in (PICKLE, SHARED_MEMORY):
+    raise ValueError("Unknown transport: {}.".format(transport))
+
+  with futures.ProcessPoolExecutor(
+      max_workers=workers,
+      initializer=_init_worker,
+      initargs=(converter,)) as executor:
+    if transport == SHARED_MEMORY:
+      results = _convert_shared_memory(executor, src_protos, chunk_size,
+                                       ordered)
+    elif ordered:
+      chunks = executor.map(_convert_chunk, _serialize_chunks(
+          src_protos, chunk_size))
+      results = list(itertools.chain.from_iterable(chunks))
+    else:
+      chunks = (future.result() for future in futures.as_completed([
+          executor.submit(_convert_chunk, chunk)
+          for chunk in _serialize_chunks(src_protos, chunk_size)
+      ]))
+      results = list(itertools.chain.from_iterable(chunks))
+
+  if serialized:
+    return results
+  from_string = converter._pb_class_to.FromString
+  return [from_string(result) for result in results]
+
+
+def _serialize_chunks(src_protos, chunk_size):
+  """Yields lists of chunk_size serialized protos."""
+
+  iterator = iter(src_protos)
+  while True:
+    chunk = [
+        bytes(src_proto) if isinstance(src_proto,
+                                       (bytes, bytearray, memoryview)) else
+        src_proto.SerializeToString()
+        for src_proto in itertools.islice(iterator, chunk_size)
+    ]
+    if not chunk:
+      return
+    yield chunk
+
+
+def _convert_shared_memory(executor, src_protos, chunk_size, ordered):
+  """Converts the protos through shared memory.
+
+  The input segment holds the offset table of the records followed by the
+  records. Each chunk has a region of the output segment to write its results
+  to, and returns their lengths.
+
+  Args:
+    executor: the ProcessPoolExecutor.
+    src_protos: the protos to convert, or their serializations.
+    chunk_size: the number of protos converted by a process at once.
+    ordered: if False, the chunks are returned in completion order.
+
+  Returns:
+    The list of serialized converted protos.
+  """
+
+  if shared_memory is None:
+    raise RuntimeError(
+        "The shared_memory transport requires Python 3.8 or later.")
+
+  records = [
+      record for chunk in _serialize_chunks(src_protos, chunk_size)
+      for record in chunk
+  ]
+  if not records:
+    return []
+
+  table_size = (len(records) + 1) * _TABLE_ITEM_SIZE
+  offsets = array.array(_TABLE_TYPECODE, [table_size])
+  for record in records:
+    offsets.append(offsets[-1] + len(record))
+
+  tasks = []
+  output_size = 0
+  for start in range(0, len(records), chunk_size):
+    end = min(start + chunk_size, len(records))
+    capacity = (
+        (offsets[end] - offsets[start]) * _OUTPUT_SIZE_FACTOR +
+        (end - start) * _OUTPUT_SIZE_PER_RECORD)
+    tasks.append((start, end, output_size, capacity))
+    output_size += capacity
+
+  input_memory = shared_memory.SharedMemory(create=True, size=offsets[-1])
+  output_memory = None
+  try:
+    input_memory.buf[:table_size] = offsets.tobytes()
+    for record, offset in zip(records, offsets):
+      input_memory.buf[offset:offset + len(record)] = record
+    del records
+
+    output_memory = shared_memory.SharedMemory(create=True, size=output_size)
+    submitted = [
+        executor.submit(_convert_shared_chunk, input_memory.name,
+                        output_memory.name, *task) for task in tasks
+    ]
+    done = submitted if ordered else futures.as_completed(submitted)
+
+    results = []
+    output_buffer = output_memory.buf
+    for future in done:
+      output_start, lengths, overflow = future.result()
+      for length in array.array(_TABLE_TYPECODE, lengths):
+        results.append(bytes(output_buffer[output_start:output_start + length]))
+        output_start += length
+      results.extend(overflow)
+    del output_buffer
+    return results
+  finally:
+    for memory in (input_memory, output_memory):
+      if memory is not None:
+        memory.close()
+        memory.unlink()
+
+
+def _convert_shared_chunk(input_name, output_name, start, end, output_start,
+                          capacity):
+  """Converts the records [start, end) of the input segment.
+
+  Args:
+    input_name: the name of the input segment.
+    output_name: the name of the output segment.
+    start: the index of the first record of the chunk.
+    end: the index after the last record of the chunk.
+    output_start: the offset of the output region of the chunk.
+    capacity: the size of the output region of the chunk.
+
+  Returns:
+    (output_start, the lengths of the results written to the output region,
+    the list of serialized results which didn't fit).
+  """
+
+  convert_bytes = _worker_converter.convert_bytes
+  input_memory = _attach_shared_memory(input_name)
+  output_memory = _attach_shared_memory(output_name)
+  input_buffer = input_memory.buf
+  output_buffer = output_memory.buf
+  offsets = input_buffer[:(end + 1) * _TABLE_ITEM_SIZE].cast(_TABLE_TYPECODE)
+  try:
+    lengths = array.array(_TABLE_TYPECODE)
+    overflow = []
+    pos = output_start
+    output_end = output_start + capacity
+    for index in range(start, end):
+      # The record view is released even if convert_bytes raises, while its
+      # traceback still references it.
+      with input_buffer[offsets[index]:offsets[index + 1]] as record:
+        result = convert_bytes(record)
+      if overflow or pos + len(result) > output_end:
+        overflow.append(result)
+        continue
+      output_buffer[pos:pos + len(result)] = result
+      lengths.append(len(result))
+      pos += len(result)
+
+    return output_start, lengths.tobytes(), overflow
+  finally:
+    # The segments can't be closed while views of them are exported.
+    offsets.release()
+    del input_buffer, output_buffer
+    input_memory.close()
+    output_memory.close()
+
+
+def _attach_shared_memory(name):
+  """Attaches to a segment owned, and unlinked, by the parent process."""
+
+  try:
+    return shared_memory.SharedMemory(name=name, track=False)
+  except TypeError:
+    # Python < 3.13 doesn't support track.
+    return shared_memory.SharedMemory(name=name)
+
+
+def _init_worker(converter):
+  global _worker_converter
+  _worker_converter = converter
+
+
+def _convert_chunk(chunk):
+  convert_bytes = _worker_converter.convert_bytes
+  return [convert_bytes(src_bytes) for src_bytes in chunk]
@@ -0,0 +1,156 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Process-wide registry of ProtoConverters.
+
+Creating a ProtoConverter validates all fields and compiles the conversion, so
+converters created for each request are cached by the registry, which evicts
+the least recently used ones beyond its maximum size.
+
+  Typical usage example:
+
+  converter = registry.get_converter(
+        pb_class_from=proto1_pb2.Proto1,
+        pb_class_to=proto2_pb2.Proto2,
+        field_names_to_ignore=["field1", "field2"])
+  proto2 = converter.convert(proto1)
+"""
+
+import collections
+import threading
+from typing import List, Optional, Type
+
+from pyproto import converter as converter_lib
+
+DEFAULT_MAXSIZE = 256
+
+CacheInfo = collections.namedtuple("CacheInfo",
+                                   ["hits", "misses", "maxsize", "currsize"])
+
+
+class ConverterRegistry(object):
+  """A thread-safe LRU cache of ProtoConverters."""
+
+  def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+    """Constructor for the ConverterRegistry.
+
+    Args:
+      maxsize: the maximum number of cached converters.
+    """
+
+    if maxsize < 1:
+      raise ValueError("maxsize must be positive, got {}.".format(maxsize))
+
+    self._maxsize = maxsize
+    self._converters = collections.OrderedDict()
+    self._lock = threading.Lock()
+    self._hits = 0
+    self._misses = 0
+
+  def get(
+      self,
+      pb_class_from: Type[converter_lib.FROM],
+      pb_class_to: Type[converter_lib.TO],
+      field_names_to_ignore: Optional[List[str]] = None,
+      converter_class: Type[
+          converter_lib.ProtoConverter] = converter_lib.ProtoConverter
+  ) -> converter_lib.ProtoConverter:
+    """Returns the cached converter, creating it on a miss.
+
+    Args:
+      pb_class_from: the proto class to convert from.
+      pb_class_to: the proto class to convert to.
+      field_names_to_ignore: the fields from the source proto that will be
+        ignored by the converter. Their order doesn't matter.
+      converter_class: ProtoConverter or a subclass accepting the same
+        constructor arguments.
+
+    Returns:
+      The converter.
+
+    Raise:
+      NotImplementedError: When creating the proto converter if there are
+      fields not handled or ignored.
+    """
+
+    key = (converter_class, pb_class_from, pb_class_to,
+           frozenset(field_names_to_ignore or ()))
+    with self._lock:
+      converter = self._converters.get(key)
+      if converter is not None:
+        self._converters.move_to_end(key)
+        self._hits += 1
+        return converter
+      self._misses += 1
+
+    # Converters are created outside of the lock, so concurrent misses may
+    # create the same converter more than once.
+    converter = converter_class(
+        pb_class_from=pb_class_from,
+        pb_class_to=pb_class_to,
+        field_names_to_ignore=list(field_names_to_ignore or ()))
+
+    with self._lock:
+      self._converters[key] = converter
+      self._converters.move_to_end(key)
+      while len(self._converters) > self._maxsize:
+        self._converters.popitem(last=False)
+    return converter
+
+  @property
+  def hits(self) -> int:
+    return self._hits
+
+  @property
+  def misses(self) -> int:
+    return self._misses
+
+  def cache_info(self) -> CacheInfo:
+    with self._lock:
+      return CacheInfo(self._hits, self._misses, self._maxsize,
+                       len(self._converters))
+
+  def clear(self):
+    """Removes all converters and resets the counters."""
+
+    with self._lock:
+      self._converters.clear()
+      self._hits = 0
+      self._misses = 0
+
+
+_default_registry = ConverterRegistry()
+
+
+def default_registry() -> ConverterRegistry:
+  return _default_registry
+
+
+def get_converter(
+    pb_class_from: Type[converter_lib.FROM],
+    pb_class_to: Type[converter_lib.TO],
+    field_names_to_ignore: Optional[List[str]] = None,
+    converter_class: Type[
+        converter_lib.ProtoConverter] = converter_lib.ProtoConverter
+) -> converter_lib.ProtoConverter:
+  """Returns the converter cached by the default registry.
+
+  See ConverterRegistry.get.
+  """
+
+  return _default_registry.get(
+      pb_class_from,
+      pb_class_to,
+      field_names_to_ignore=field_names_to_ignore,
+      converter_class=converter_class)
@@ -0,0 +1,155 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Streaming conversion of length-delimited proto files.
+
+Each record of a length-delimited file is a varint with the size of the
+serialized proto followed by the serialized proto, as written by the Java
+writeDelimitedTo() and the C++ SerializeDelimitedToOstream(). Files are read
+and written in large blocks, and only one block plus the current record is
+held in memory.
+
+  Typical usage example:
+
+  converter = ProtoConverter(
+        pb_class_from=proto1_pb2.Proto1,
+        pb_class_to=proto2_pb2.Proto2)
+  with open("proto1.bin", "rb") as reader, open("proto2.bin", "wb") as writer:
+    convert_stream(converter, reader, writer)
+"""
+
+from typing import BinaryIO, Iterable, Iterator
+
+from google.protobuf import message
+
+from pyproto import converter as converter_lib
+from pyproto import wire
+
+DEFAULT_BLOCK_SIZE = 1 << 20
+
+
+def convert_stream(converter: converter_lib.ProtoConverter,
+                   reader: BinaryIO,
+                   writer: BinaryIO,
+                   block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+  """Converts length-delimited records from reader into writer.
+
+  Args:
+    converter: the converter of the records.
+    reader: binary file of length-delimited pb_class_from records.
+    writer: binary file to write length-delimited pb_class_to records to.
+    block_size: the size of the blocks read from reader and written to writer.
+
+  Returns:
+    The number of converted records.
+
+  Raises:
+    message.DecodeError: if reader ends in the middle of a record.
+  """
+
+  records = (converter.convert_bytes(record)
+             for record in read_delimited(reader, block_size))
+  return write_delimited(writer, records, block_size)
+
+
+def read_delimited(reader: BinaryIO,
+                   block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[bytes]:
+  """Yields the serialized protos of a length-delimited file.
+
+  Args:
+    reader: binary file of length-delimited records.
+    block_size: the size of the blocks read from reader.
+
+  Yields:
+    The serialized proto of each record.
+
+  Raises:
+    message.DecodeError: if reader ends in the middle of a record.
+  """
+
+  buffer = bytearray()
+  pos = 0
+  while True:
+    end = len(buffer)
+    while pos < end:
+      length, record_start = _decode_length(buffer, pos, end)
+      if record_start < 0 or record_start + length > end:
+        break
+      pos = record_start + length
+      yield bytes(buffer[record_start:pos])
+
+    block = reader.read(block_size)
+    if not block:
+      if pos < end:
+        raise message.DecodeError("Truncated length-delimited record.")
+      return
+    del buffer[:pos]
+    pos = 0
+    buffer += block
+
+
+def write_delimited(writer: BinaryIO,
+                    records: Iterable[bytes],
+                    block_size: int = DEFAULT_BLOCK_SIZE) -> int:
+  """Writes serialized protos to a length-delimited file.
+
+  Args:
+    writer: binary file to write the records to.
+    records: the serialized protos.
+    block_size: the size of the blocks written to writer.
+
+  Returns:
+    The number of written records.
+  """
+
+  buffer = bytearray()
+  count = 0
+  for record in records:
+    buffer += wire.encode_varint(len(record))
+    buffer += record
+    count += 1
+    if len(buffer) >= block_size:
+      writer.write(buffer)
+      buffer = bytearray()
+
+  if buffer:
+    writer.write(buffer)
+  return count
+
+
+def _decode_length(buffer, pos, end):
+  """Decodes the record length at pos.
+
+  Args:
+    buffer: the read buffer.
+    pos: position of the varint length.
+    end: end of the read data in buffer.
+
+  Returns:
+    (length, position of the record), with a negative position if the length
+    isn't fully read yet.
+  """
+
+  length = 0
+  shift = 0
+  while pos < end:
+    byte = buffer[pos]
+    pos += 1
+    length |= (byte & 0x7F) << shift
+    if not byte & 0x80:
+      return length, pos
+    shift += 7
+    if shift >= 64:
+      raise message.DecodeError("Too many bytes when decoding varint.")
+  return 0, -1
@@ -0,0 +1,171 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Wire format helpers.
+
+This module walks serialized protos without parsing them into messages. It's
+used by ProtoConverter to transcode serialized protos whose fields only differ
+in their numbers by rewriting the tags of the fields.
+"""
+
+from typing import Dict, Tuple, Union
+
+from google.protobuf import message
+
+WIRETYPE_VARINT = 0
+WIRETYPE_FIXED64 = 1
+WIRETYPE_LENGTH_DELIMITED = 2
+WIRETYPE_START_GROUP = 3
+WIRETYPE_END_GROUP = 4
+WIRETYPE_FIXED32 = 5
+
+# The wire types a field can be encoded with, except END_GROUP which only closes
+# a group.
+FIELD_WIRETYPES = (WIRETYPE_VARINT, WIRETYPE_FIXED64, WIRETYPE_LENGTH_DELIMITED,
+                   WIRETYPE_START_GROUP, WIRETYPE_FIXED32)
+
+# Tag table value for fields that are copied with their original tag into the
+# fallback buffer.
+FALLBACK = object()
+
+
+def encode_varint(value: int) -> bytes:
+  """Encodes a non-negative int as a varint."""
+
+  result = bytearray()
+  while value > 0x7F:
+    result.append((value & 0x7F) | 0x80)
+    value >>= 7
+  result.append(value)
+  return bytes(result)
+
+
+def decode_varint(buffer, pos: int) -> Tuple[int, int]:
+  """Decodes the varint at buffer[pos].
+
+  Args:
+    buffer: bytes-like object to decode from.
+    pos: position of the varint.
+
+  Returns:
+    (value, position after the varint).
+
+  Raises:
+    message.DecodeError: if the varint is truncated or too long.
+  """
+
+  result = 0
+  shift = 0
+  try:
+    while True:
+      byte = buffer[pos]
+      pos += 1
+      result |= (byte & 0x7F) << shift
+      if not byte & 0x80:
+        return result, pos
+      shift += 7
+      if shift >= 64:
+        raise message.DecodeError("Too many bytes when decoding varint.")
+  except IndexError:
+    raise message.DecodeError("Truncated varint.") from None
+
+
+def make_tag(field_number: int, wire_type: int) -> int:
+  return (field_number << 3) | wire_type
+
+
+def transcode(src_bytes: bytes,
+              tag_table: Dict[int, Union[bytes, object]]
+             ) -> Tuple[bytearray, bytearray]:
+  """Rewrites the tags of the top-level fields of a serialized proto.
+
+  Args:
+    src_bytes: the serialized proto.
+    tag_table: src tag to the encoded dest tag replacing it, or FALLBACK.
+      Fields whose tag isn't in the table are dropped.
+
+  Returns:
+    (the transcoded fields, the FALLBACK fields with their original tags).
+
+  Raises:
+    message.DecodeError: if src_bytes isn't a valid serialized proto.
+  """
+
+  buffer = memoryview(src_bytes)
+  end = len(buffer)
+  dest = bytearray()
+  fallback = bytearray()
+  get_target = tag_table.get
+  pos = 0
+  while pos < end:
+    start = pos
+    tag = buffer[pos]
+    if tag < 0x80:
+      pos += 1
+    else:
+      tag, pos = decode_varint(buffer, pos)
+
+    # Inlines _skip_value for single byte varints and lengths.
+    value_start = pos
+    wire_type = tag & 7
+    if (wire_type <= WIRETYPE_LENGTH_DELIMITED and wire_type != WIRETYPE_FIXED64
+        and pos < end and buffer[pos] < 0x80):
+      pos += 1
+      if wire_type == WIRETYPE_LENGTH_DELIMITED:
+        pos += buffer[value_start]
+    else:
+      pos = _skip_value(buffer, pos, tag)
+    if pos > end:
+      raise message.DecodeError("Truncated message.")
+
+    target = get_target(tag)
+    if target is None:
+      continue
+    if target is FALLBACK:
+      fallback += buffer[start:pos]
+    else:
+      dest += target
+      dest += buffer[value_start:pos]
+
+  return dest, fallback
+
+
+def _skip_value(buffer, pos, tag):
+  """Returns the position after the value of the field with tag at pos."""
+
+  wire_type = tag & 7
+  if wire_type == WIRETYPE_VARINT:
+    try:
+      while buffer[pos] & 0x80:
+        pos += 1
+    except IndexError:
+      raise message.DecodeError("Truncated varint.") from None
+    return pos + 1
+  if wire_type == WIRETYPE_LENGTH_DELIMITED:
+    length, pos = decode_varint(buffer, pos)
+    return pos + length
+  if wire_type == WIRETYPE_FIXED64:
+    return pos + 8
+  if wire_type == WIRETYPE_FIXED32:
+    return pos + 4
+  if wire_type == WIRETYPE_START_GROUP:
+    end_tag = make_tag(tag >> 3, WIRETYPE_END_GROUP)
+    while True:
+      if pos >= len(buffer):
+        raise message.DecodeError("Missing group end tag.")
+      tag, pos = decode_varint(buffer, pos)
+      if tag == end_tag:
+        return pos
+      pos = _skip_value(buffer, pos, tag)
+  raise message.DecodeError("Unexpected wire type {}.".format(wire_type))
@@ -0,0 +1,226 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of pyproto.aio."""
+
+import asyncio
+from concurrent import futures
+import threading
+import time
+import unittest
+
+from pyproto import converter
+
+import protos
+
+test_pb2 = protos.make_module(
+    "aio_test_pb2", "pyproto.tests.aio", """
+  Record { int32 id = 1; }
+  RenumberedRecord { int32 id = 5; }
+""")
+
+
+class TrackingConverter(converter.ProtoConverter):
+  """Records the conversions in flight and blocks on the ids in block_ids."""
+
+  def __init__(self):
+    super().__init__(test_pb2.Record, test_pb2.RenumberedRecord)
+    self.lock = threading.Lock()
+    self.in_flight = 0
+    self.max_in_flight = 0
+    self.converted_ids = []
+    self.block_ids = ()
+    self.unblock = threading.Event()
+
+  @converter.convert_field(field_names=["id"])
+  def id_convert_function(self, src_proto, dest_proto):
+    with self.lock:
+      self.in_flight += 1
+      self.max_in_flight = max(self.max_in_flight, self.in_flight)
+      self.converted_ids.append(src_proto.id)
+    if src_proto.id in self.block_ids:
+      self.unblock.wait()
+    # Later protos finish first.
+    time.sleep(0.001 * (src_proto.id % 3))
+    dest_proto.id = src_proto.id
+    with self.lock:
+      self.in_flight -= 1
+
+
+def _src_protos(count=30):
+  return [test_pb2.Record(id=i) for i in range(count)]
+
+
+async def _async_source(src_protos, read_ids):
+  for src_proto in src_protos:
+    read_ids.append(src_proto.id)
+    await asyncio.sleep(0)
+    yield src_proto
+
+
+class ConvertAsyncTest(unittest.IsolatedAsyncioTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.converter = TrackingConverter()
+    self.executor = futures.ThreadPoolExecutor(max_workers=16)
+
+  def tearDown(self):
+    self.converter.unblock.set()
+    self.executor.shutdown(wait=True)
+    super().tearDown()
+
+  async def test_convert_async(self):
+    self.assertEqual(
+        await self.converter.convert_async(test_pb2.Record(id=3)),
+        test_pb2.RenumberedRecord(id=3))
+    self.assertEqual(
+        await self.converter.convert_async(
+            test_pb2.Record(id=4), executor=self.executor),
+        test_pb2.RenumberedRecord(id=4))
+
+  async def test_order(self):
+    src_protos = _src_protos()
+    expected = [test_pb2.RenumberedRecord(id=i) for i in range(30)]
+    for concurrency in (1, 4, 100):
+      with self.subTest(concurrency=concurrency):
+        self.assertEqual([
+            dest_proto async for dest_proto in self.converter.convert_aiter(
+                src_protos, concurrency=concurrency, executor=self.executor)
+        ], expected)
+        self.assertEqual([
+            dest_proto async for dest_proto in self.converter.convert_aiter(
+                _async_source(src_protos, []),
+                concurrency=concurrency,
+                executor=self.executor)
+        ], expected)
+
+  async def test_backpressure(self):
+    read_ids = []
+    dest_protos = self.converter.convert_aiter(
+        _async_source(_src_protos(), read_ids),
+        concurrency=3,
+        executor=self.executor)
+    await dest_protos.__anext__()
+    # The source isn't read ahead of the conversions in flight.
+    self.assertEqual(read_ids, [0, 1, 2])
+    consumed = 1
+    async for _ in dest_protos:
+      consumed += 1
+      self.assertLessEqual(len(read_ids) - consumed, 3)
+    self.assertEqual(consumed, 30)
+    self.assertLessEqual(self.converter.max_in_flight, 3)
+
+  async def test_aclose_cancels_pending_conversions(self):
+    executor = futures.ThreadPoolExecutor(max_workers=1)
+    self.addCleanup(executor.shutdown, wait=True)
+    self.converter.block_ids = (1,)
+    dest_protos = self.converter.convert_aiter(
+        _src_protos(), concurrency=4, executor=executor)
+
+    self.assertEqual(await dest_protos.__anext__(),
+                     test_pb2.RenumberedRecord(id=0))
+    # 1 is converting and blocked, 2 and 3 are queued in the executor.
+    await dest_protos.aclose()
+    # Let the loop propagate the cancellations to the executor.
+    await asyncio.sleep(0)
+    self.converter.unblock.set()
+    executor.shutdown(wait=True)
+    self.assertEqual(self.converter.converted_ids, [0, 1])
+
+  async def test_invalid_concurrency(self):
+    with self.assertRaises(ValueError):
+      async for _ in self.converter.convert_aiter(_src_protos(), concurrency=0):
+        pass
+
+  async def test_cooperative(self):
+    ticks = 0
+    stop = False
+
+    async def tick():
+      nonlocal ticks
+      while not stop:
+        ticks += 1
+        await asyncio.sleep(0)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0)
+    try:
+      ticks_per_proto = []
+      async for dest_proto in self.converter.convert_aiter(
+          _async_source(_src_protos(), []),
+          cooperative=True,
+          yield_every=10,
+          yield_interval=60):
+        ticks_per_proto.append(ticks)
+        self.assertEqual(self.converter.in_flight, 0)
+      self.assertEqual(dest_proto, test_pb2.RenumberedRecord(id=29))
+    finally:
+      stop = True
+      await ticker
+
+    # The source yields to the loop on every read, so the loop runs between
+    # all protos, and converting is done on the loop thread.
+    self.assertEqual(ticks_per_proto, sorted(ticks_per_proto))
+    self.assertGreater(ticks_per_proto[-1], ticks_per_proto[0])
+
+  async def test_cooperative_yield_every(self):
+    ticks = 0
+    stop = False
+
+    async def tick():
+      nonlocal ticks
+      while not stop:
+        ticks += 1
+        await asyncio.sleep(0)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0)
+    try:
+      ticks_per_proto = [
+          ticks async for _ in self.converter.convert_aiter(
+              _src_protos(), cooperative=True, yield_every=10,
+              yield_interval=60)
+      ]
+    finally:
+      stop = True
+      await ticker
+
+    # A sync source never yields to the loop, so the loop only runs every
+    # yield_every protos.
+    self.assertEqual(len(set(ticks_per_proto)), 3)
+    self.assertEqual(ticks_per_proto[:10], [ticks_per_proto[0]] * 10)
+    self.assertEqual(ticks_per_proto[10:20], [ticks_per_proto[10]] * 10)
+    self.assertGreater(ticks_per_proto[10], ticks_per_proto[9])
+
+    ticks = 0
+    stop = False
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0)
+    try:
+      ticks_per_proto = [
+          ticks async for _ in self.converter.convert_aiter(
+              _src_protos(), cooperative=True, yield_every=1000,
+              yield_interval=0)
+      ]
+    finally:
+      stop = True
+      await ticker
+
+    # yield_interval elapses on every proto.
+    self.assertEqual(len(set(ticks_per_proto)), len(ticks_per_proto))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,133 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of pyproto.codegen."""
+
+import os
+import tempfile
+import unittest
+
+from google.protobuf import any_pb2
+from google.protobuf import descriptor_pb2
+
+from pyproto import codegen
+
+import protos
+
+_MESSAGES = """
+  Leaf { int32 n = 1; }
+  Node {
+    string name = 1;
+    %s packme = 2;
+    repeated Node kids = 3;
+    map<string, Leaf> leaves = 4;
+  }
+  Only { int32 kept = 1; %s gone = 2; }
+  Holder { Only only = 1; int32 n = 2; }
+"""
+
+src_pb2 = protos.make_module("codegen_src_pb2", "pyproto.tests.v1",
+                             _MESSAGES % ("Leaf", "int32"))
+dest_pb2 = protos.make_module("codegen_dest_pb2", "pyproto.tests.v2",
+                              _MESSAGES % ("google.protobuf.Any", "string"))
+
+
+class CodegenTest(unittest.TestCase):
+
+  def generate(self, *args):
+    """Runs codegen.main and returns the namespace of the generated module."""
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      output = os.path.join(tmp_dir, "converters.py")
+      self.assertEqual(codegen.main(list(args) + ["--output=" + output]), 0)
+      with open(output) as f:
+        source = f.read()
+    namespace = {}
+    exec(compile(source, output, "exec"), namespace)
+    return namespace
+
+  def generate_from_modules(self, *args):
+    return self.generate("--src_module=codegen_src_pb2",
+                         "--dest_module=codegen_dest_pb2", *args)
+
+  def generate_from_descriptor_set(self, *args):
+    file_descriptor_set = descriptor_pb2.FileDescriptorSet()
+    for file_descriptor in (any_pb2.DESCRIPTOR, src_pb2.DESCRIPTOR,
+                            dest_pb2.DESCRIPTOR):
+      file_descriptor.CopyToProto(file_descriptor_set.file.add())
+    with tempfile.TemporaryDirectory() as tmp_dir:
+      descriptor_set = os.path.join(tmp_dir, "protos.pb")
+      with open(descriptor_set, "wb") as f:
+        f.write(file_descriptor_set.SerializeToString())
+      return self.generate("--descriptor_set=" + descriptor_set,
+                           "--src_package=pyproto.tests.v1",
+                           "--dest_package=pyproto.tests.v2", *args)
+
+  def assert_converts_complete_pairs(self, module):
+    src_proto = src_pb2.Node(
+        name="root",
+        packme=src_pb2.Leaf(n=1),
+        kids=[src_pb2.Node(name="kid", kids=[src_pb2.Node(name="grandkid")])],
+        leaves={"a": src_pb2.Leaf(n=2)})
+
+    dest_proto = module["convert_Node"](src_proto)
+
+    expected = dest_pb2.Node(
+        name="root",
+        kids=[
+            dest_pb2.Node(name="kid", kids=[dest_pb2.Node(name="grandkid")])
+        ],
+        leaves={"a": dest_pb2.Leaf(n=2)})
+    expected.packme.Pack(src_pb2.Leaf(n=1))
+    self.assertEqual(dest_proto, expected)
+    self.assertEqual(module["convert_Leaf"](src_pb2.Leaf(n=3)),
+                     dest_pb2.Leaf(n=3))
+    self.assertEqual(
+        module["UNHANDLED_FIELDS"], {
+            "pyproto.tests.v1.Holder": ("only",),
+            "pyproto.tests.v1.Only": ("gone",),
+        })
+
+  def test_modules(self):
+    module = self.generate_from_modules()
+    self.assert_converts_complete_pairs(module)
+    self.assertNotIn("convert_Only", module)
+    self.assertNotIn("convert_Holder", module)
+    self.assertEqual(
+        set(module["CONVERTERS"]), {
+            ("pyproto.tests.v1.Leaf", "pyproto.tests.v2.Leaf"),
+            ("pyproto.tests.v1.Node", "pyproto.tests.v2.Node"),
+        })
+
+  def test_descriptor_set(self):
+    module = self.generate_from_descriptor_set()
+    self.assert_converts_complete_pairs(module)
+    self.assertNotIn("convert_Only", module)
+    self.assertNotIn("convert_Holder", module)
+
+  def test_allow_unhandled(self):
+    for module in (self.generate_from_modules("--allow_unhandled"),
+                   self.generate_from_descriptor_set("--allow_unhandled")):
+      self.assert_converts_complete_pairs(module)
+      self.assertEqual(
+          module["convert_Only"](src_pb2.Only(kept=1, gone=2)),
+          dest_pb2.Only(kept=1))
+      self.assertEqual(
+          module["convert_Holder"](
+              src_pb2.Holder(only=src_pb2.Only(kept=1), n=2)),
+          dest_pb2.Holder(n=2))
+
+
+if __name__ == "__main__":
+  unittest.main()
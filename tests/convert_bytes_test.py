@@ -0,0 +1,142 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests that convert_bytes converts like convert in every wire mode."""
+
+import unittest
+
+from pyproto import converter
+
+import protos
+
+_NODE_FIELDS = """
+  int32 x = %d;
+  string s = %d;
+  %s leaf = %d;
+  repeated int64 r = %d;
+  double d = %d;
+"""
+
+test_pb2 = protos.make_module(
+    "convert_bytes_test_pb2", "pyproto.tests.convert_bytes", """
+  Leaf { int32 n = 1; string s = 2; }
+  Node { %s }
+  SameNode { %s }
+  WideNode { %s string extra = 7; }
+  RenumberedNode { %s }
+  PackedNode { %s }
+  AnyLeaf { google.protobuf.Any leaf = 3; }
+""" % (_NODE_FIELDS % (1, 2, "Leaf", 3, 4, 6),
+       _NODE_FIELDS % (1, 2, "Leaf", 3, 4, 6),
+       _NODE_FIELDS % (1, 2, "Leaf", 3, 4, 6),
+       _NODE_FIELDS % (11, 12, "Leaf", 13, 14, 16),
+       _NODE_FIELDS % (1, 12, "google.protobuf.Any", 3, 4, 6)))
+
+required_pb2 = protos.make_module(
+    "convert_bytes_required_test_pb2", "pyproto.tests.convert_bytes_required",
+    """
+  Leaf { optional int32 n = 1; }
+  Src { required int32 id = 1; optional Leaf leaf = 2; }
+  Renumbered { required int32 id = 5; optional google.protobuf.Any leaf = 2; }
+  Packed { required int32 id = 1; optional google.protobuf.Any leaf = 2; }
+""",
+    syntax="proto2")
+
+Leaf = test_pb2.Leaf
+Node = test_pb2.Node
+
+
+def _src_protos():
+  return [
+      Node(),
+      Node(x=1, s="s", leaf=Leaf(n=2, s="leaf"), r=[1, -2, 2**40], d=1.5),
+      Node(x=-1, s="\u00e9" * 200, r=list(range(300)), d=-0.0),
+      Node(leaf=Leaf()),
+      Node(x=2**31 - 1, d=float("inf")),
+  ]
+
+
+class ConvertBytesTest(unittest.TestCase):
+
+  def assert_converts_like_convert(self, proto_converter, wire_mode,
+                                   src_protos=None):
+    self.assertEqual(proto_converter._wire_mode, wire_mode)
+    pb_class_to = proto_converter._pb_class_to
+    for src_proto in src_protos or _src_protos():
+      with self.subTest(src_proto=src_proto):
+        src_bytes = src_proto.SerializeToString()
+        expected = proto_converter.convert(src_proto)
+        self.assertEqual(
+            pb_class_to.FromString(proto_converter.convert_bytes(src_bytes)),
+            expected)
+        self.assertEqual(
+            pb_class_to.FromString(
+                proto_converter.convert_bytes(memoryview(src_bytes))),
+            expected)
+
+  def test_passthrough(self):
+    self.assert_converts_like_convert(
+        converter.ProtoConverter(Node, test_pb2.SameNode), "passthrough")
+
+  def test_reparse(self):
+    self.assert_converts_like_convert(
+        converter.ProtoConverter(Node, test_pb2.WideNode), "reparse")
+
+  def test_transcode(self):
+    self.assert_converts_like_convert(
+        converter.ProtoConverter(Node, test_pb2.RenumberedNode), "transcode")
+
+  def test_transcode_ignored_fields(self):
+    self.assert_converts_like_convert(
+        converter.ProtoConverter(
+            Node, test_pb2.RenumberedNode, field_names_to_ignore=["s", "r"]),
+        "transcode")
+
+  def test_transcode_with_fallback(self):
+    self.assert_converts_like_convert(
+        converter.ProtoConverter(Node, test_pb2.PackedNode), "transcode")
+
+  def test_transcode_required_fields(self):
+    src_protos = [
+        required_pb2.Src(id=1, leaf=required_pb2.Leaf(n=2)),
+        required_pb2.Src(id=0),
+    ]
+    for pb_class_to in (required_pb2.Renumbered, required_pb2.Packed):
+      self.assert_converts_like_convert(
+          converter.ProtoConverter(required_pb2.Src, pb_class_to),
+          "transcode", src_protos)
+
+  def test_convert(self):
+    self.assert_converts_like_convert(
+        converter.ProtoConverter(
+            Node, test_pb2.AnyLeaf, field_names_to_ignore=["x", "s", "r", "d"]),
+        "convert")
+
+  def test_convert_functions(self):
+
+    class NodeConverter(converter.ProtoConverter):
+
+      @converter.convert_field(field_names=["x"])
+      def x_convert_function(self, src_proto, dest_proto):
+        # Reads other source fields and auto-converted fields.
+        dest_proto.x = src_proto.x + len(src_proto.s) + len(dest_proto.r)
+
+    proto_converter = NodeConverter(Node, test_pb2.RenumberedNode)
+    self.assert_converts_like_convert(proto_converter, "convert")
+    self.assertEqual(
+        proto_converter.convert(Node(x=1, s="ab", r=[1, 2, 3])).x, 6)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,943 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of pyproto.converter."""
+
+import math
+import unittest
+from unittest import mock
+
+from pyproto import converter
+
+import protos
+
+test_pb2 = protos.make_module(
+    "converter_test_pb2", "pyproto.tests.converter", """
+  Leaf { int32 n = 1; string s = 2; }
+  Node { int32 x = 1; string s = 2; Leaf leaf = 3; repeated int64 r = 4; }
+  RenumberedNode {
+    int32 x = 11; string s = 12; Leaf leaf = 13; repeated int64 r = 14;
+  }
+  AnyHolder {
+    google.protobuf.Any one = 1;
+    repeated google.protobuf.Any many = 2;
+    map<string, google.protobuf.Any> by_key = 3;
+  }
+  LeafHolder {
+    Leaf one = 1; repeated Leaf many = 2; map<string, Leaf> by_key = 3;
+  }
+  OtherLeaf { string s = 5; int32 n = 6; }
+  OtherLeafHolder {
+    OtherLeaf one = 1;
+    repeated OtherLeaf many = 2;
+    map<string, OtherLeaf> by_key = 3;
+  }
+  NarrowLeaf { int32 n = 1; }
+  NarrowLeafHolder {
+    NarrowLeaf one = 1;
+    repeated NarrowLeaf many = 2;
+    map<string, NarrowLeaf> by_key = 3;
+  }
+  Wrapper { LeafHolder holder = 1; int32 n = 2; }
+  OtherWrapper { OtherLeafHolder holder = 1; int32 n = 2; }
+  Tree { int32 v = 1; Tree next = 2; repeated Tree kids = 3; }
+  OtherTree { int32 v = 5; OtherTree next = 6; repeated OtherTree kids = 7; }
+  E1 { int32 v = 1; F1 f = 2; }
+  F1 { E1 e = 1; map<string, E1> es = 2; }
+  E2 { F2 f = 2; int32 v = 3; }
+  F2 { map<string, E2> es = 2; E2 e = 4; }
+  G1 { H1 h = 1; }
+  H1 { G1 g = 1; string extra = 2; }
+  G2 { H2 h = 1; }
+  H2 { G2 g = 1; }
+  Union {
+    oneof u { int32 a = 1; string b = 2; Leaf c = 3; int32 d = 4; }
+    int32 z = 5;
+  }
+  OtherUnion {
+    int32 z = 1;
+    oneof u { Leaf c = 2; string b = 3; int32 a = 4; int32 d = 6; }
+  }
+  Address { string city = 1; int32 zip = 2; }
+  Person {
+    string name = 1;
+    Address addr = 2;
+    int32 age = 3;
+    double score = 4;
+    repeated string tags = 5;
+    float ratio = 6;
+    double weight = 7;
+  }
+  Info { int32 age = 1; double score = 2; repeated string labels = 3; }
+  FlatPerson {
+    string title = 1;
+    string city = 2;
+    int32 zip = 3;
+    Info info = 4;
+    float ratio = 6;
+    double weight = 17;
+  }
+""")
+
+_WIDE_UNION_SIZE = 200
+
+wide_pb2 = protos.make_module(
+    "converter_wide_test_pb2", "pyproto.tests.converter_wide", """
+  WideUnion { oneof u { %s } }
+  OtherWideUnion { oneof u { %s } }
+""" % ("".join("int32 f{0} = {0};".format(i)
+               for i in range(1, _WIDE_UNION_SIZE + 1)),
+       "".join("int32 f{0} = {1};".format(i, i + 1000)
+               for i in range(1, _WIDE_UNION_SIZE + 1))))
+
+
+def _pack(message, type_url_prefix="type.googleapis.com/"):
+  any_proto = test_pb2.AnyHolder().one
+  any_proto.Pack(message, type_url_prefix)
+  return any_proto
+
+
+class CompiledCacheTest(unittest.TestCase):
+
+  def make_converter_class(self):
+
+    class NodeConverter(converter.ProtoConverter):
+
+      @converter.convert_field(field_names=["x"])
+      def x_convert_function(self, src_proto, dest_proto):
+        dest_proto.x = src_proto.x + 1
+
+    return NodeConverter
+
+  def test_instances_reuse_compiled_state(self):
+    converter_class = self.make_converter_class()
+    with mock.patch.object(
+        converter_class,
+        "_compile_uncached",
+        autospec=True,
+        side_effect=converter.ProtoConverter._compile_uncached) as compile_:
+      first = converter_class(test_pb2.Node, test_pb2.RenumberedNode)
+      second = converter_class(test_pb2.Node, test_pb2.RenumberedNode)
+      self.assertEqual(compile_.call_count, 1)
+      converter_class(
+          test_pb2.Node, test_pb2.RenumberedNode, field_names_to_ignore=["s"])
+      self.assertEqual(compile_.call_count, 2)
+
+    self.assertIs(second._plan, first._plan)
+    self.assertIs(second._auto_convert_function, first._auto_convert_function)
+    # The lists are copied, so that they can't be changed through another
+    # instance.
+    self.assertIsNot(second._convert_functions, first._convert_functions)
+    self.assertEqual(second._convert_functions, first._convert_functions)
+    src_proto = test_pb2.Node(x=1, s="s", r=[2])
+    self.assertEqual(
+        second.convert(src_proto),
+        test_pb2.RenumberedNode(x=2, s="s", r=[2]))
+
+  def test_subclass_caches(self):
+    converter_class = self.make_converter_class()
+    self.assertIsNot(converter_class._compiled_cache,
+                     converter.ProtoConverter._compiled_cache)
+
+    proto_converter = converter.ProtoConverter(test_pb2.Node,
+                                               test_pb2.RenumberedNode)
+    subclass_converter = converter_class(test_pb2.Node,
+                                         test_pb2.RenumberedNode)
+    self.assertIsNot(subclass_converter._plan, proto_converter._plan)
+    self.assertEqual(
+        proto_converter.convert(test_pb2.Node(x=1)),
+        test_pb2.RenumberedNode(x=1))
+    self.assertEqual(
+        subclass_converter.convert(test_pb2.Node(x=1)),
+        test_pb2.RenumberedNode(x=2))
+    self.assertEqual(len(converter_class._compiled_cache), 1)
+
+  def test_cache_bound(self):
+    converter_class = self.make_converter_class()
+    ignored_fields = [[], ["s"], ["r"], ["s", "r"]]
+    with mock.patch.object(converter, "_MAX_COMPILED_CONVERTERS", 2):
+      for field_names_to_ignore in ignored_fields[:3]:
+        converter_class(
+            test_pb2.Node,
+            test_pb2.RenumberedNode,
+            field_names_to_ignore=field_names_to_ignore)
+      self.assertEqual(len(converter_class._compiled_cache), 2)
+
+      # ["s"] becomes the most recently used, so ["r"] is evicted.
+      with mock.patch.object(
+          converter_class,
+          "_compile_uncached",
+          autospec=True,
+          side_effect=converter.ProtoConverter._compile_uncached) as compile_:
+        converter_class(
+            test_pb2.Node,
+            test_pb2.RenumberedNode,
+            field_names_to_ignore=["s"])
+        self.assertEqual(compile_.call_count, 0)
+        converter_class(
+            test_pb2.Node,
+            test_pb2.RenumberedNode,
+            field_names_to_ignore=["s", "r"])
+        self.assertEqual(compile_.call_count, 1)
+        converter_class(
+            test_pb2.Node,
+            test_pb2.RenumberedNode,
+            field_names_to_ignore=["s"])
+        self.assertEqual(compile_.call_count, 1)
+        converter_class(
+            test_pb2.Node,
+            test_pb2.RenumberedNode,
+            field_names_to_ignore=["r"])
+        self.assertEqual(compile_.call_count, 2)
+      self.assertEqual(len(converter_class._compiled_cache), 2)
+
+
+class AutoUnpackAnyTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.converter = converter.ProtoConverter(
+        test_pb2.AnyHolder, test_pb2.LeafHolder, auto_unpack_any=True)
+
+  def assert_converts(self, src_proto, expected):
+    self.assertEqual(self.converter.convert(src_proto), expected)
+    self.assertEqual(
+        test_pb2.LeafHolder.FromString(
+            self.converter.convert_bytes(src_proto.SerializeToString())),
+        expected)
+
+  def test_singular(self):
+    self.assert_converts(
+        test_pb2.AnyHolder(one=_pack(test_pb2.Leaf(n=1, s="a"))),
+        test_pb2.LeafHolder(one=test_pb2.Leaf(n=1, s="a")))
+    # An empty Leaf is still set.
+    self.assert_converts(
+        test_pb2.AnyHolder(one=_pack(test_pb2.Leaf())),
+        test_pb2.LeafHolder(one=test_pb2.Leaf()))
+    self.assertTrue(
+        self.converter.convert(
+            test_pb2.AnyHolder(one=_pack(test_pb2.Leaf()))).HasField("one"))
+    self.assertFalse(
+        self.converter.convert(test_pb2.AnyHolder()).HasField("one"))
+
+  def test_repeated(self):
+    self.assert_converts(
+        test_pb2.AnyHolder(many=[
+            _pack(test_pb2.Leaf(n=1)),
+            _pack(test_pb2.Leaf()),
+            _pack(test_pb2.Leaf(s="c"), "example.com/types/"),
+        ]),
+        test_pb2.LeafHolder(
+            many=[test_pb2.Leaf(n=1),
+                  test_pb2.Leaf(),
+                  test_pb2.Leaf(s="c")]))
+
+  def test_map(self):
+    self.assert_converts(
+        test_pb2.AnyHolder(by_key={
+            "a": _pack(test_pb2.Leaf(n=1)),
+            "b": _pack(test_pb2.Leaf()),
+        }),
+        test_pb2.LeafHolder(by_key={
+            "a": test_pb2.Leaf(n=1),
+            "b": test_pb2.Leaf(),
+        }))
+
+  def test_type_url_mismatch(self):
+    wrong_any = _pack(test_pb2.Node(x=1))
+    for src_proto in (test_pb2.AnyHolder(one=wrong_any),
+                      test_pb2.AnyHolder(
+                          many=[_pack(test_pb2.Leaf()), wrong_any]),
+                      test_pb2.AnyHolder(by_key={"a": wrong_any})):
+      with self.subTest(src_proto=src_proto):
+        with self.assertRaisesRegex(TypeError, "pyproto.tests.converter.Node"):
+          self.converter.convert(src_proto)
+        with self.assertRaises(TypeError):
+          self.converter.convert_bytes(src_proto.SerializeToString())
+
+  def test_requires_auto_unpack_any(self):
+    with self.assertRaises(NotImplementedError):
+      converter.ProtoConverter(test_pb2.AnyHolder, test_pb2.LeafHolder)
+
+
+class AutoConvertNestedTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.converter = converter.ProtoConverter(
+        test_pb2.LeafHolder, test_pb2.OtherLeafHolder,
+        auto_convert_nested=True)
+
+  def assert_converts(self, proto_converter, src_proto, expected):
+    self.assertEqual(proto_converter.convert(src_proto), expected)
+    self.assertEqual(
+        type(expected).FromString(
+            proto_converter.convert_bytes(src_proto.SerializeToString())),
+        expected)
+
+  def test_singular(self):
+    self.assert_converts(
+        self.converter, test_pb2.LeafHolder(one=test_pb2.Leaf(n=1, s="a")),
+        test_pb2.OtherLeafHolder(one=test_pb2.OtherLeaf(n=1, s="a")))
+    self.assertTrue(
+        self.converter.convert(
+            test_pb2.LeafHolder(one=test_pb2.Leaf())).HasField("one"))
+    self.assertFalse(
+        self.converter.convert(test_pb2.LeafHolder()).HasField("one"))
+
+  def test_repeated(self):
+    self.assert_converts(
+        self.converter,
+        test_pb2.LeafHolder(
+            many=[test_pb2.Leaf(n=1), test_pb2.Leaf(), test_pb2.Leaf(s="c")]),
+        test_pb2.OtherLeafHolder(many=[
+            test_pb2.OtherLeaf(n=1),
+            test_pb2.OtherLeaf(),
+            test_pb2.OtherLeaf(s="c")
+        ]))
+
+  def test_map(self):
+    self.assert_converts(
+        self.converter,
+        test_pb2.LeafHolder(by_key={
+            "a": test_pb2.Leaf(n=1),
+            "b": test_pb2.Leaf()
+        }),
+        test_pb2.OtherLeafHolder(by_key={
+            "a": test_pb2.OtherLeaf(n=1),
+            "b": test_pb2.OtherLeaf()
+        }))
+
+  def test_deeply_nested(self):
+    self.assert_converts(
+        converter.ProtoConverter(
+            test_pb2.Wrapper, test_pb2.OtherWrapper, auto_convert_nested=True),
+        test_pb2.Wrapper(
+            holder=test_pb2.LeafHolder(
+                one=test_pb2.Leaf(n=1),
+                many=[test_pb2.Leaf(s="b")],
+                by_key={"c": test_pb2.Leaf(n=3)}),
+            n=4),
+        test_pb2.OtherWrapper(
+            holder=test_pb2.OtherLeafHolder(
+                one=test_pb2.OtherLeaf(n=1),
+                many=[test_pb2.OtherLeaf(s="b")],
+                by_key={"c": test_pb2.OtherLeaf(n=3)}),
+            n=4))
+
+  def test_requires_auto_convert_nested(self):
+    with self.assertRaises(NotImplementedError):
+      converter.ProtoConverter(test_pb2.LeafHolder, test_pb2.OtherLeafHolder)
+
+  def test_rejects_partially_convertible_protos(self):
+    # Leaf.s has no NarrowLeaf field, so the nested protos aren't converted.
+    with self.assertRaises(NotImplementedError):
+      converter.ProtoConverter(
+          test_pb2.LeafHolder,
+          test_pb2.NarrowLeafHolder,
+          auto_convert_nested=True)
+    for field_name in ("one", "many", "by_key"):
+      field_names_to_ignore = list({"one", "many", "by_key"} - {field_name})
+      with self.subTest(field_name=field_name):
+        with self.assertRaisesRegex(NotImplementedError, field_name):
+          converter.ProtoConverter(
+              test_pb2.LeafHolder,
+              test_pb2.NarrowLeafHolder,
+              field_names_to_ignore=field_names_to_ignore,
+              auto_convert_nested=True)
+    # The other way around, all the fields of NarrowLeaf are convertible.
+    self.assert_converts(
+        converter.ProtoConverter(
+            test_pb2.NarrowLeafHolder,
+            test_pb2.LeafHolder,
+            auto_convert_nested=True),
+        test_pb2.NarrowLeafHolder(
+            one=test_pb2.NarrowLeaf(n=1),
+            many=[test_pb2.NarrowLeaf(n=2)],
+            by_key={"a": test_pb2.NarrowLeaf(n=3)}),
+        test_pb2.LeafHolder(
+            one=test_pb2.Leaf(n=1),
+            many=[test_pb2.Leaf(n=2)],
+            by_key={"a": test_pb2.Leaf(n=3)}))
+
+
+class LeafConverter(converter.ProtoConverter):
+  """Converts Leaf to OtherLeaf, recording the batches of s."""
+
+  batch_sizes = []
+
+  @converter.convert_field(field_names=["n"])
+  def n_convert_function(self, src_proto, dest_proto):
+    dest_proto.n = src_proto.n * 10
+
+  @converter.convert_field_batch(field_names=["s"])
+  def s_convert_function(self, src_protos, dest_protos):
+    self.batch_sizes.append(len(src_protos))
+    for src_proto, dest_proto in zip(src_protos, dest_protos):
+      # Runs after the other handler.
+      dest_proto.s = "{}{}".format(src_proto.s.upper(), dest_proto.n)
+
+
+class FieldConvertersTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    LeafConverter.batch_sizes = []
+    self.converter = converter.ProtoConverter(
+        test_pb2.LeafHolder,
+        test_pb2.OtherLeafHolder,
+        field_converters={
+            "one": LeafConverter,
+            "many": LeafConverter,
+            "by_key": LeafConverter,
+        })
+
+  def test_convert(self):
+    src_proto = test_pb2.LeafHolder(
+        one=test_pb2.Leaf(n=1, s="a"),
+        many=[test_pb2.Leaf(n=2, s="b"),
+              test_pb2.Leaf(),
+              test_pb2.Leaf(s="c")],
+        by_key={"d": test_pb2.Leaf(n=3, s="d")})
+    expected = test_pb2.OtherLeafHolder(
+        one=test_pb2.OtherLeaf(n=10, s="A10"),
+        many=[
+            test_pb2.OtherLeaf(n=20, s="B20"),
+            test_pb2.OtherLeaf(s="0"),
+            test_pb2.OtherLeaf(s="C0")
+        ],
+        by_key={"d": test_pb2.OtherLeaf(n=30, s="D30")})
+    self.assertEqual(self.converter.convert(src_proto), expected)
+    self.assertEqual(
+        test_pb2.OtherLeafHolder.FromString(
+            self.converter.convert_bytes(src_proto.SerializeToString())),
+        expected)
+
+  def test_repeated_fields_are_converted_in_one_batch(self):
+    self.converter.convert(
+        test_pb2.LeafHolder(many=[test_pb2.Leaf(n=i) for i in range(5)]))
+    self.assertEqual(LeafConverter.batch_sizes, [5])
+    LeafConverter.batch_sizes = []
+    self.converter.convert_many([
+        test_pb2.LeafHolder(many=[test_pb2.Leaf(n=i) for i in range(3)]),
+        test_pb2.LeafHolder(),
+        test_pb2.LeafHolder(
+            one=test_pb2.Leaf(), many=[test_pb2.Leaf(n=i) for i in range(2)]),
+    ])
+    self.assertEqual(LeafConverter.batch_sizes, [3, 1, 2])
+
+  def test_converter_instance(self):
+    leaf_converter = LeafConverter(test_pb2.Leaf, test_pb2.OtherLeaf)
+    proto_converter = converter.ProtoConverter(
+        test_pb2.LeafHolder,
+        test_pb2.OtherLeafHolder,
+        field_converters={
+            "one": leaf_converter,
+            "many": leaf_converter,
+            "by_key": leaf_converter,
+        })
+    self.assertEqual(
+        proto_converter.convert(
+            test_pb2.LeafHolder(many=[test_pb2.Leaf(n=1, s="a")])),
+        test_pb2.OtherLeafHolder(many=[test_pb2.OtherLeaf(n=10, s="A10")]))
+
+    with self.assertRaises(TypeError):
+      converter.ProtoConverter(
+          test_pb2.LeafHolder,
+          test_pb2.OtherLeafHolder,
+          field_converters={"one": LeafConverter(test_pb2.Leaf, test_pb2.Leaf)},
+          auto_convert_nested=True)
+
+  def test_invalid_fields(self):
+    field_converters = {
+        "one": LeafConverter,
+        "many": LeafConverter,
+        "by_key": LeafConverter,
+    }
+    for kwargs, message in (
+        ({"field_names_to_ignore": ["one"]}, "ignored"),
+        ({"field_mapping": {"one": "one"}}, "field_mapping"),
+        ({"field_mapping": {"one.n": "one.n"}}, "field_mapping"),
+        ({"field_converters": dict(field_converters, missing=LeafConverter)},
+         "both protos"),
+    ):
+      kwargs.setdefault("field_converters", field_converters)
+      with self.subTest(kwargs=kwargs):
+        with self.assertRaisesRegex(ValueError, message):
+          converter.ProtoConverter(
+              test_pb2.LeafHolder,
+              test_pb2.OtherLeafHolder,
+              auto_convert_nested=True,
+              **kwargs)
+
+
+class RecursiveConversionTest(unittest.TestCase):
+
+  def test_deep_recursion(self):
+    depth = 3000
+    src_proto = test_pb2.Tree()
+    node = src_proto
+    for i in range(depth):
+      node.v = i
+      node.kids.add(v=-i)
+      node = node.next
+
+    dest_proto = converter.ProtoConverter(
+        test_pb2.Tree, test_pb2.OtherTree,
+        auto_convert_nested=True).convert(src_proto)
+
+    node = dest_proto
+    for i in range(depth):
+      self.assertEqual(node.v, i)
+      self.assertEqual(list(node.kids), [test_pb2.OtherTree(v=-i)])
+      node = node.next
+    self.assertFalse(node.HasField("next"))
+
+  def test_mutual_recursion(self):
+    depth = 2500
+    src_proto = test_pb2.E1()
+    node = src_proto
+    for i in range(depth):
+      node.v = i
+      node.f.es["k"].v = -i
+      node = node.f.e
+
+    dest_proto = converter.ProtoConverter(
+        test_pb2.E1, test_pb2.E2, auto_convert_nested=True).convert(src_proto)
+
+    node = dest_proto
+    for i in range(depth):
+      self.assertEqual(node.v, i)
+      self.assertEqual(dict(node.f.es), {"k": test_pb2.E2(v=-i)})
+      node = node.f.e
+    self.assertEqual(node, test_pb2.E2())
+
+  def test_rejects_cycle_with_unconvertible_field(self):
+    # H1.extra has no H2 field, so neither of the pairs of the cycle is
+    # converted.
+    for pb_class_from, pb_class_to in ((test_pb2.G1, test_pb2.G2),
+                                       (test_pb2.H1, test_pb2.H2)):
+      with self.subTest(pb_class_from=pb_class_from):
+        with self.assertRaises(NotImplementedError):
+          converter.ProtoConverter(
+              pb_class_from, pb_class_to, auto_convert_nested=True)
+    # The other way around, all the fields are convertible.
+    self.assertEqual(
+        converter.ProtoConverter(
+            test_pb2.G2, test_pb2.G1, auto_convert_nested=True).convert(
+                test_pb2.G2(h=test_pb2.H2(g=test_pb2.G2()))),
+        test_pb2.G1(h=test_pb2.H1(g=test_pb2.G1())))
+
+
+class UnionConverter(converter.ProtoConverter):
+
+  @converter.convert_field(field_names=["b"])
+  def b_convert_function(self, src_proto, dest_proto):
+    if src_proto.HasField("b"):
+      dest_proto.b = src_proto.b.upper()
+
+
+class OneofDispatchTest(unittest.TestCase):
+
+  def assert_converts(self, proto_converter, src_proto, expected):
+    self.assertEqual(proto_converter.convert(src_proto), expected)
+    self.assertEqual(
+        type(expected).FromString(
+            proto_converter.convert_bytes(src_proto.SerializeToString())),
+        expected)
+
+  def test_dispatch(self):
+    proto_converter = converter.ProtoConverter(test_pb2.Union,
+                                               test_pb2.OtherUnion)
+    self.assertIn("WhichOneof('u')",
+                  proto_converter._auto_convert_function.source)
+    for src_proto, expected in (
+        (test_pb2.Union(), test_pb2.OtherUnion()),
+        (test_pb2.Union(a=1, z=2), test_pb2.OtherUnion(a=1, z=2)),
+        (test_pb2.Union(b="b"), test_pb2.OtherUnion(b="b")),
+        (test_pb2.Union(c=test_pb2.Leaf(n=1)),
+         test_pb2.OtherUnion(c=test_pb2.Leaf(n=1))),
+        (test_pb2.Union(d=4), test_pb2.OtherUnion(d=4)),
+    ):
+      with self.subTest(src_proto=src_proto):
+        self.assert_converts(proto_converter, src_proto, expected)
+
+  def test_default_values(self):
+    proto_converter = converter.ProtoConverter(test_pb2.Union,
+                                               test_pb2.OtherUnion)
+    for src_proto, case in ((test_pb2.Union(a=0), "a"),
+                            (test_pb2.Union(b=""), "b"),
+                            (test_pb2.Union(c=test_pb2.Leaf()), "c")):
+      with self.subTest(case=case):
+        self.assertEqual(src_proto.WhichOneof("u"), case)
+        self.assertEqual(
+            proto_converter.convert(src_proto).WhichOneof("u"), case)
+        self.assertEqual(
+            test_pb2.OtherUnion.FromString(
+                proto_converter.convert_bytes(
+                    src_proto.SerializeToString())).WhichOneof("u"), case)
+
+  def test_ignored_and_handled_cases(self):
+    proto_converter = UnionConverter(
+        test_pb2.Union, test_pb2.OtherUnion, field_names_to_ignore=["d"])
+    for src_proto, expected in (
+        (test_pb2.Union(a=0), test_pb2.OtherUnion(a=0)),
+        (test_pb2.Union(b="b"), test_pb2.OtherUnion(b="B")),
+        (test_pb2.Union(c=test_pb2.Leaf()),
+         test_pb2.OtherUnion(c=test_pb2.Leaf())),
+        (test_pb2.Union(d=4, z=1), test_pb2.OtherUnion(z=1)),
+    ):
+      with self.subTest(src_proto=src_proto):
+        self.assert_converts(proto_converter, src_proto, expected)
+
+    # With a single case left, the oneof isn't dispatched.
+    proto_converter = converter.ProtoConverter(
+        test_pb2.Union,
+        test_pb2.OtherUnion,
+        field_names_to_ignore=["a", "b", "d"])
+    self.assertNotIn("WhichOneof",
+                     proto_converter._auto_convert_function.source)
+    self.assert_converts(proto_converter,
+                         test_pb2.Union(c=test_pb2.Leaf(n=1)),
+                         test_pb2.OtherUnion(c=test_pb2.Leaf(n=1)))
+    self.assert_converts(proto_converter, test_pb2.Union(a=1, z=1),
+                         test_pb2.OtherUnion(z=1))
+
+  def test_wide_union_is_generated(self):
+    proto_converter = converter.ProtoConverter(wide_pb2.WideUnion,
+                                               wide_pb2.OtherWideUnion)
+    self.assertGreater(_WIDE_UNION_SIZE, converter._MAX_GENERATED_ACTIONS)
+    # One WhichOneof replaces the presence checks of all the cases.
+    self.assertEqual(
+        proto_converter._auto_convert_function.source.count("WhichOneof"), 1)
+    self.assertNotIn("HasField", proto_converter._auto_convert_function.source)
+    for i in (1, 129, _WIDE_UNION_SIZE):
+      field_name = "f{}".format(i)
+      for value in (0, i):
+        with self.subTest(field_name=field_name, value=value):
+          self.assert_converts(proto_converter,
+                               wide_pb2.WideUnion(**{field_name: value}),
+                               wide_pb2.OtherWideUnion(**{field_name: value}))
+    self.assert_converts(proto_converter, wide_pb2.WideUnion(),
+                         wide_pb2.OtherWideUnion())
+
+
+class SkipIfAbsentTest(unittest.TestCase):
+
+  def test_skip_if_absent(self):
+
+    class NodeConverter(converter.ProtoConverter):
+
+      calls = []
+
+      @converter.convert_field(field_names=["x", "leaf"], skip_if_absent=True)
+      def x_convert_function(self, src_proto, dest_proto):
+        self.calls.append("x")
+        dest_proto.x = src_proto.x + src_proto.leaf.n
+
+      @converter.convert_field(field_names=["s"])
+      def s_convert_function(self, src_proto, dest_proto):
+        self.calls.append("s")
+
+    proto_converter = NodeConverter(test_pb2.Node, test_pb2.RenumberedNode)
+    for src_proto, calls, expected in (
+        (test_pb2.Node(), ["s"], test_pb2.RenumberedNode()),
+        (test_pb2.Node(s="s", r=[1]), ["s"],
+         test_pb2.RenumberedNode(s="s", r=[1])),
+        (test_pb2.Node(x=1), ["s", "x"], test_pb2.RenumberedNode(x=1)),
+        (test_pb2.Node(leaf=test_pb2.Leaf(n=2)), ["s", "x"],
+         test_pb2.RenumberedNode(x=2, leaf=test_pb2.Leaf(n=2))),
+    ):
+      with self.subTest(src_proto=src_proto):
+        NodeConverter.calls = []
+        self.assertEqual(proto_converter.convert(src_proto), expected)
+        self.assertEqual(NodeConverter.calls, calls)
+
+  def test_invalid_field_names(self):
+    for field_names in ([], ["x", "missing"], ["leaf.n"]):
+
+      class NodeConverter(converter.ProtoConverter):
+
+        @converter.convert_field(
+            field_names=field_names, skip_if_absent=True)
+        def x_convert_function(self, src_proto, dest_proto):
+          pass
+
+      with self.subTest(field_names=field_names):
+        with self.assertRaisesRegex(ValueError, "x_convert_function"):
+          NodeConverter(test_pb2.Node, test_pb2.RenumberedNode)
+
+
+class BatchConvertFunctionsTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+
+    class NodeConverter(converter.ProtoConverter):
+
+      batch_sizes = []
+
+      # Sorts before x_convert_function, but is still called after it.
+      @converter.convert_field_batch(field_names=["s"])
+      def a_s_convert_function(self, src_protos, dest_protos):
+        self.batch_sizes.append(len(src_protos))
+        for src_proto, dest_proto in zip(src_protos, dest_protos):
+          dest_proto.s = "{}:{}".format(src_proto.s, dest_proto.x)
+
+      @converter.convert_field(field_names=["x"])
+      def x_convert_function(self, src_proto, dest_proto):
+        dest_proto.x = src_proto.x + len(dest_proto.r)
+
+    self.converter_class = NodeConverter
+    self.converter = NodeConverter(test_pb2.Node, test_pb2.RenumberedNode)
+    self.src_protos = [
+        test_pb2.Node(x=i, s="s{}".format(i), r=[1, 2]) for i in range(5)
+    ]
+    self.expected = [
+        test_pb2.RenumberedNode(x=i + 2, s="s{}:{}".format(i, i + 2), r=[1, 2])
+        for i in range(5)
+    ]
+
+  def test_convert(self):
+    for src_proto, expected in zip(self.src_protos, self.expected):
+      self.assertEqual(self.converter.convert(src_proto), expected)
+      self.assertEqual(
+          test_pb2.RenumberedNode.FromString(
+              self.converter.convert_bytes(src_proto.SerializeToString())),
+          expected)
+    self.assertEqual(self.converter_class.batch_sizes, [1] * 10)
+
+  def test_convert_many(self):
+    self.assertEqual(self.converter.convert_many(self.src_protos),
+                     self.expected)
+    self.assertEqual(self.converter_class.batch_sizes, [5])
+
+    out = [test_pb2.RenumberedNode()] * 7
+    self.assertIs(self.converter.convert_many(self.src_protos, out=out), out)
+    self.assertEqual(out, self.expected)
+    self.assertEqual(self.converter_class.batch_sizes, [5, 5])
+
+  def test_convert_many_lazy(self):
+    with mock.patch.object(converter, "_LAZY_BATCH_SIZE", 2):
+      self.assertEqual(
+          list(self.converter.convert_many(iter(self.src_protos), lazy=True)),
+          self.expected)
+    self.assertEqual(self.converter_class.batch_sizes, [2, 2, 1])
+
+
+class ValueFunctionsTest(unittest.TestCase):
+
+  def test_scalar_and_repeated_fields(self):
+
+    class NodeConverter(converter.ProtoConverter):
+
+      calls = []
+
+      @converter.convert_value("s")
+      def s_convert_function(self, s):
+        self.calls.append(s)
+        return s.upper()
+
+      @converter.convert_value("r")
+      def r_convert_function(self, r):
+        return [value * 10 for value in r]
+
+      @converter.convert_value("leaf")
+      def leaf_convert_function(self, leaf):
+        return test_pb2.Leaf(n=leaf.n + 1)
+
+    proto_converter = NodeConverter(test_pb2.Node, test_pb2.RenumberedNode)
+    for src_proto, expected, calls in (
+        (test_pb2.Node(), test_pb2.RenumberedNode(), []),
+        # The values replace the auto-conversion of the fields.
+        (test_pb2.Node(x=1, s="ab", r=[1, 2], leaf=test_pb2.Leaf(n=1)),
+         test_pb2.RenumberedNode(
+             x=1, s="AB", r=[10, 20], leaf=test_pb2.Leaf(n=2)), ["ab"]),
+        (test_pb2.Node(leaf=test_pb2.Leaf()),
+         test_pb2.RenumberedNode(leaf=test_pb2.Leaf(n=1)), []),
+    ):
+      with self.subTest(src_proto=src_proto):
+        NodeConverter.calls = []
+        self.assertEqual(proto_converter.convert(src_proto), expected)
+        self.assertEqual(NodeConverter.calls, calls)
+        self.assertEqual(proto_converter.convert_many([src_proto]), [expected])
+
+  def test_message_fields(self):
+
+    class HolderConverter(converter.ProtoConverter):
+
+      @converter.convert_value("one")
+      def one_convert_function(self, one):
+        return test_pb2.OtherLeaf(n=one.n, s=one.s)
+
+      @converter.convert_value("many")
+      def many_convert_function(self, many):
+        return [test_pb2.OtherLeaf(n=leaf.n) for leaf in many]
+
+      @converter.convert_value("by_key")
+      def by_key_convert_function(self, by_key):
+        return {
+            key: test_pb2.OtherLeaf(s=leaf.s) for key, leaf in by_key.items()
+        }
+
+    self.assertEqual(
+        HolderConverter(test_pb2.LeafHolder, test_pb2.OtherLeafHolder).convert(
+            test_pb2.LeafHolder(
+                one=test_pb2.Leaf(n=1, s="a"),
+                many=[test_pb2.Leaf(n=2), test_pb2.Leaf(n=3)],
+                by_key={"b": test_pb2.Leaf(s="b")})),
+        test_pb2.OtherLeafHolder(
+            one=test_pb2.OtherLeaf(n=1, s="a"),
+            many=[test_pb2.OtherLeaf(n=2), test_pb2.OtherLeaf(n=3)],
+            by_key={"b": test_pb2.OtherLeaf(s="b")}))
+
+  def test_renamed_field(self):
+
+    class WrapperConverter(converter.ProtoConverter):
+
+      @converter.convert_value("holder", to="n")
+      def holder_convert_function(self, holder):
+        return len(holder.many)
+
+    self.assertEqual(
+        WrapperConverter(
+            test_pb2.Wrapper, test_pb2.OtherWrapper,
+            field_names_to_ignore=["n"]).convert(
+                test_pb2.Wrapper(
+                    holder=test_pb2.LeafHolder(many=[test_pb2.Leaf()] * 3),
+                    n=1)), test_pb2.OtherWrapper(n=3))
+
+  def test_unknown_field(self):
+
+    class NodeConverter(converter.ProtoConverter):
+
+      @converter.convert_value("s", to="missing")
+      def s_convert_function(self, s):
+        return s
+
+    with self.assertRaisesRegex(ValueError, "missing"):
+      NodeConverter(test_pb2.Node, test_pb2.RenumberedNode)
+
+
+_PERSON_MAPPING = {
+    "name": "title",
+    "addr.city": "city",
+    "addr.zip": "zip",
+    "age": "info.age",
+    "score": "info.score",
+    "tags": "info.labels",
+}
+
+
+class FieldMappingTest(unittest.TestCase):
+
+  def assert_converts(self, proto_converter, src_proto, expected):
+    self.assertEqual(proto_converter.convert(src_proto), expected)
+    self.assertEqual(
+        type(expected).FromString(
+            proto_converter.convert_bytes(src_proto.SerializeToString())),
+        expected)
+
+  def test_field_mapping(self):
+    proto_converter = converter.ProtoConverter(
+        test_pb2.Person, test_pb2.FlatPerson, field_mapping=_PERSON_MAPPING)
+    self.assertEqual(proto_converter._wire_mode, "transcode")
+    self.assert_converts(
+        proto_converter,
+        test_pb2.Person(
+            name="n",
+            addr=test_pb2.Address(city="c", zip=1),
+            age=2,
+            score=0.5,
+            tags=["a", "b"],
+            ratio=0.25,
+            weight=3.0),
+        test_pb2.FlatPerson(
+            title="n",
+            city="c",
+            zip=1,
+            info=test_pb2.Info(age=2, score=0.5, labels=["a", "b"]),
+            ratio=0.25,
+            weight=3.0))
+    # The destination protos are only created for set fields.
+    self.assert_converts(proto_converter, test_pb2.Person(),
+                         test_pb2.FlatPerson())
+    self.assert_converts(proto_converter,
+                         test_pb2.Person(addr=test_pb2.Address()),
+                         test_pb2.FlatPerson())
+    self.assertFalse(
+        proto_converter.convert(test_pb2.Person(name="n")).HasField("info"))
+
+  def test_negative_zero(self):
+
+    class PersonConverter(converter.ProtoConverter):
+
+      @converter.convert_value("ratio")
+      def ratio_convert_function(self, ratio):
+        return ratio
+
+    # -0.0 is set, for auto-converted and mapped fields and value handlers.
+    src_proto = test_pb2.Person(score=-0.0, ratio=-0.0, weight=-0.0)
+    for proto_converter in (
+        converter.ProtoConverter(
+            test_pb2.Person, test_pb2.FlatPerson,
+            field_mapping=_PERSON_MAPPING),
+        PersonConverter(
+            test_pb2.Person, test_pb2.FlatPerson,
+            field_mapping=_PERSON_MAPPING),
+    ):
+      for dest_proto in (proto_converter.convert(src_proto),
+                         test_pb2.FlatPerson.FromString(
+                             proto_converter.convert_bytes(
+                                 src_proto.SerializeToString()))):
+        self.assertTrue(dest_proto.HasField("info"))
+        for value in (dest_proto.info.score, dest_proto.ratio,
+                      dest_proto.weight):
+          self.assertEqual(math.copysign(1.0, value), -1.0)
+
+  def test_unmapped_fields_of_mapped_protos(self):
+    field_mapping = dict(_PERSON_MAPPING)
+    del field_mapping["addr.zip"]
+    with self.assertRaisesRegex(NotImplementedError, "addr.zip"):
+      converter.ProtoConverter(
+          test_pb2.Person, test_pb2.FlatPerson, field_mapping=field_mapping)
+
+    self.assert_converts(
+        converter.ProtoConverter(
+            test_pb2.Person,
+            test_pb2.FlatPerson,
+            field_names_to_ignore=["addr.zip"],
+            field_mapping=field_mapping),
+        test_pb2.Person(addr=test_pb2.Address(city="c", zip=1)),
+        test_pb2.FlatPerson(city="c"))
+
+  def test_invalid_mappings(self):
+    for update in (
+        {"addr.missing": "city"},
+        {"tags.x": "city"},
+        {"age": "title"},
+        {"addr.city": "info.age"},
+        {"weight": "ratio"},
+    ):
+      field_mapping = dict(_PERSON_MAPPING, **update)
+      with self.subTest(field_mapping=field_mapping):
+        with self.assertRaises(ValueError):
+          converter.ProtoConverter(
+              test_pb2.Person,
+              test_pb2.FlatPerson,
+              field_mapping=field_mapping)
+
+
+if __name__ == "__main__":
+  unittest.main()
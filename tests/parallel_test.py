@@ -0,0 +1,215 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of pyproto.parallel."""
+
+import pickle
+import unittest
+
+from pyproto import converter
+from pyproto import parallel
+
+import protos
+
+test_pb2 = protos.make_module(
+    "parallel_test_pb2", "pyproto.tests.parallel", """
+  Record { int32 id = 1; string payload = 2; }
+  RenumberedRecord { int32 id = 5; string payload = 6; }
+""")
+
+
+class OffsetConverter(converter.ProtoConverter):
+  """Adds an offset, which is pickled to the workers, to the ids."""
+
+  def __init__(self, offset):
+    self.offset = offset
+    super().__init__(test_pb2.Record, test_pb2.RenumberedRecord)
+
+  @converter.convert_field(field_names=["id"])
+  def id_convert_function(self, src_proto, dest_proto):
+    if src_proto.id < 0:
+      raise ValueError("Negative id: {}.".format(src_proto.id))
+    dest_proto.id = src_proto.id + self.offset
+
+
+class PaddingConverter(converter.ProtoConverter):
+  """Converts to protos much larger than the source protos."""
+
+  def __init__(self):
+    super().__init__(test_pb2.Record, test_pb2.RenumberedRecord)
+
+  @converter.convert_field(field_names=["payload"])
+  def payload_convert_function(self, src_proto, dest_proto):
+    if src_proto.payload == "TypeError":
+      raise TypeError("Bad payload.")
+    dest_proto.payload = src_proto.payload * (src_proto.id % 4) * 200
+
+
+def _src_protos(count=50):
+  return [
+      test_pb2.Record(id=i, payload="x" * (i % 7)) for i in range(count)
+  ]
+
+
+class ConvertParallelTest(unittest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.converter = converter.ProtoConverter(test_pb2.Record,
+                                              test_pb2.RenumberedRecord)
+
+  def expected(self, proto_converter, src_protos):
+    return [proto_converter.convert(src_proto) for src_proto in src_protos]
+
+  def test_ordered(self):
+    src_protos = _src_protos()
+    self.assertEqual(
+        self.converter.convert_parallel(src_protos, workers=2, chunk_size=3),
+        self.expected(self.converter, src_protos))
+
+  def test_unordered(self):
+    src_protos = _src_protos()
+    results = self.converter.convert_parallel(
+        src_protos, workers=2, chunk_size=3, ordered=False)
+    self.assertCountEqual([result.id for result in results],
+                          [src_proto.id for src_proto in src_protos])
+    self.assertEqual(
+        sorted(results, key=lambda result: result.id),
+        self.expected(self.converter, src_protos))
+
+  def test_serialized(self):
+    src_protos = _src_protos()
+    results = self.converter.convert_parallel(
+        src_protos, workers=2, chunk_size=7, serialized=True)
+    self.assertTrue(all(isinstance(result, bytes) for result in results))
+    self.assertEqual(
+        [test_pb2.RenumberedRecord.FromString(result) for result in results],
+        self.expected(self.converter, src_protos))
+
+  def test_mixed_input(self):
+    src_protos = _src_protos()
+    mixed = [
+        src_proto.SerializeToString() if i % 3 == 0 else
+        memoryview(src_proto.SerializeToString()) if i % 3 == 1 else src_proto
+        for i, src_proto in enumerate(src_protos)
+    ]
+    self.assertEqual(
+        self.converter.convert_parallel(iter(mixed), workers=2, chunk_size=4),
+        self.expected(self.converter, src_protos))
+
+  def test_empty(self):
+    self.assertEqual(self.converter.convert_parallel([], workers=2), [])
+
+  def test_invalid_arguments(self):
+    with self.assertRaises(ValueError):
+      self.converter.convert_parallel(_src_protos(), chunk_size=0)
+    with self.assertRaises(ValueError):
+      self.converter.convert_parallel(_src_protos(), transport="carrier pigeon")
+
+  def test_worker_exception(self):
+    proto_converter = OffsetConverter(0)
+    src_protos = _src_protos() + [test_pb2.Record(id=-1)]
+    for ordered in (True, False):
+      with self.subTest(ordered=ordered):
+        with self.assertRaisesRegex(ValueError, "Negative id: -1"):
+          proto_converter.convert_parallel(
+              src_protos, workers=2, chunk_size=5, ordered=ordered)
+
+  def test_subclass(self):
+    proto_converter = OffsetConverter(1000)
+    src_protos = _src_protos()
+    self.assertEqual(
+        proto_converter.convert_parallel(src_protos, workers=2, chunk_size=6),
+        self.expected(proto_converter, src_protos))
+    self.assertEqual(
+        proto_converter.convert_parallel(src_protos[:1], workers=1)[0].id,
+        1000)
+
+  def test_pickle(self):
+    proto_converter = OffsetConverter(1000)
+    unpickled = pickle.loads(pickle.dumps(proto_converter))
+    self.assertIsInstance(unpickled, OffsetConverter)
+    self.assertEqual(unpickled.offset, 1000)
+    for src_proto in _src_protos(5):
+      self.assertEqual(
+          unpickled.convert(src_proto), proto_converter.convert(src_proto))
+      self.assertEqual(
+          unpickled.convert_bytes(src_proto.SerializeToString()),
+          proto_converter.convert_bytes(src_proto.SerializeToString()))
+
+
+class SharedMemoryTest(unittest.TestCase):
+
+  def convert_parallel(self, proto_converter, src_protos, **kwargs):
+    return proto_converter.convert_parallel(
+        src_protos, workers=2, transport=parallel.SHARED_MEMORY, **kwargs)
+
+  def test_convert(self):
+    proto_converter = converter.ProtoConverter(test_pb2.Record,
+                                               test_pb2.RenumberedRecord)
+    src_protos = _src_protos()
+    expected = [proto_converter.convert(src_proto) for src_proto in src_protos]
+    self.assertEqual(
+        self.convert_parallel(proto_converter, src_protos, chunk_size=4),
+        expected)
+    results = self.convert_parallel(
+        proto_converter, src_protos, chunk_size=4, ordered=False)
+    self.assertEqual(sorted(results, key=lambda result: result.id), expected)
+
+  def test_output_overflow(self):
+    # Most results are larger than the output capacity of their chunk, and
+    # are returned through the overflow list.
+    proto_converter = PaddingConverter()
+    src_protos = _src_protos()
+    expected = [proto_converter.convert(src_proto) for src_proto in src_protos]
+    self.assertGreater(
+        sum(result.ByteSize() for result in expected),
+        parallel._OUTPUT_SIZE_FACTOR *
+        sum(src_proto.ByteSize() for src_proto in src_protos) +
+        parallel._OUTPUT_SIZE_PER_RECORD * len(src_protos))
+    for chunk_size in (1, 3, 100):
+      with self.subTest(chunk_size=chunk_size):
+        self.assertEqual(
+            self.convert_parallel(
+                proto_converter, src_protos, chunk_size=chunk_size), expected)
+        self.assertEqual(
+            [
+                test_pb2.RenumberedRecord.FromString(result)
+                for result in self.convert_parallel(
+                    proto_converter,
+                    src_protos,
+                    chunk_size=chunk_size,
+                    serialized=True)
+            ], expected)
+
+  def test_empty(self):
+    proto_converter = converter.ProtoConverter(test_pb2.Record,
+                                               test_pb2.RenumberedRecord)
+    self.assertEqual(self.convert_parallel(proto_converter, []), [])
+    self.assertEqual(self.convert_parallel(proto_converter, iter([])), [])
+
+  def test_worker_exception(self):
+    # The segments are closed after an error, which used to raise a
+    # BufferError hiding the error of the conversion.
+    proto_converter = PaddingConverter()
+    src_protos = _src_protos() + [test_pb2.Record(id=1, payload="TypeError")]
+    for ordered in (True, False):
+      with self.subTest(ordered=ordered):
+        with self.assertRaisesRegex(TypeError, "Bad payload"):
+          self.convert_parallel(
+              proto_converter, src_protos, chunk_size=5, ordered=ordered)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,189 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Builds the proto modules of the tests without protoc.
+
+Messages are declared with a subset of the proto syntax: fields with an
+optional label, map fields and oneofs, e.g.
+
+  Node { int32 x = 1; repeated Node kids = 2; map<string, Leaf> leaves = 3; }
+  Union { oneof u { int32 a = 1; Leaf b = 2; } }
+
+Message types are relative to the package, except google.protobuf.Any.
+"""
+
+import re
+import sys
+import types
+
+from google.protobuf import any_pb2
+from google.protobuf import descriptor_pb2
+from google.protobuf import descriptor_pool
+from google.protobuf import message_factory
+
+_ANY_TYPE = "google.protobuf.Any"
+
+_FieldProto = descriptor_pb2.FieldDescriptorProto
+
+_SCALAR_TYPES = {
+    "double": _FieldProto.TYPE_DOUBLE,
+    "float": _FieldProto.TYPE_FLOAT,
+    "int64": _FieldProto.TYPE_INT64,
+    "uint64": _FieldProto.TYPE_UINT64,
+    "int32": _FieldProto.TYPE_INT32,
+    "uint32": _FieldProto.TYPE_UINT32,
+    "sint32": _FieldProto.TYPE_SINT32,
+    "sint64": _FieldProto.TYPE_SINT64,
+    "fixed32": _FieldProto.TYPE_FIXED32,
+    "fixed64": _FieldProto.TYPE_FIXED64,
+    "bool": _FieldProto.TYPE_BOOL,
+    "string": _FieldProto.TYPE_STRING,
+    "bytes": _FieldProto.TYPE_BYTES,
+}
+
+_LABELS = {
+    "optional": _FieldProto.LABEL_OPTIONAL,
+    "required": _FieldProto.LABEL_REQUIRED,
+    "repeated": _FieldProto.LABEL_REPEATED,
+}
+
+_TOKEN_RE = re.compile(r"[A-Za-z_][\w.]*|\d+|[{}<>=;,]")
+
+
+def make_module(module_name, package, source, syntax="proto3"):
+  """Creates a module like the _pb2 module protoc generates.
+
+  The module is registered in sys.modules, so it can be imported, e.g. by
+  generated converters, and its classes can be pickled in forked processes.
+
+  Args:
+    module_name: the name of the module, ending with _pb2. The proto file is
+      named after it.
+    package: the proto package of the messages.
+    source: the messages.
+    syntax: "proto2" or "proto3".
+
+  Returns:
+    The module, with the DESCRIPTOR of the file and a class per message.
+  """
+
+  file_proto = descriptor_pb2.FileDescriptorProto(
+      name=module_name[:-len("_pb2")] + ".proto",
+      package=package,
+      syntax=syntax)
+  _parse_messages(_TOKEN_RE.findall(source), file_proto)
+  if _ANY_TYPE in source:
+    file_proto.dependency.append(any_pb2.DESCRIPTOR.name)
+
+  pool = descriptor_pool.DescriptorPool()
+  pool.AddSerializedFile(any_pb2.DESCRIPTOR.serialized_pb)
+  pool.AddSerializedFile(file_proto.SerializeToString())
+
+  module = types.ModuleType(module_name)
+  module.DESCRIPTOR = pool.FindFileByName(file_proto.name)
+  for name, message_descriptor in (
+      module.DESCRIPTOR.message_types_by_name.items()):
+    message_class = _get_message_class(message_descriptor)
+    message_class.__module__ = module_name
+    setattr(module, name, message_class)
+  sys.modules[module_name] = module
+  return module
+
+
+def _get_message_class(message_descriptor):
+  if hasattr(message_factory, "GetMessageClass"):
+    return message_factory.GetMessageClass(message_descriptor)
+  return message_factory.MessageFactory(
+      message_descriptor.file.pool).GetPrototype(message_descriptor)
+
+
+def _parse_messages(tokens, file_proto):
+  """Parses `Name { fields }` declarations into file_proto."""
+
+  tokens = list(reversed(tokens))
+  while tokens:
+    message_proto = file_proto.message_type.add(name=tokens.pop())
+    _expect(tokens, "{")
+    while tokens[-1] != "}":
+      if tokens[-1] == "oneof":
+        tokens.pop()
+        oneof_index = len(message_proto.oneof_decl)
+        message_proto.oneof_decl.add(name=tokens.pop())
+        _expect(tokens, "{")
+        while tokens[-1] != "}":
+          _parse_field(tokens, file_proto, message_proto, oneof_index)
+        tokens.pop()
+      else:
+        _parse_field(tokens, file_proto, message_proto)
+    tokens.pop()
+
+
+def _parse_field(tokens, file_proto, message_proto, oneof_index=None):
+  """Parses `[label] type name = number;` into message_proto."""
+
+  label = "optional"
+  if tokens[-1] in _LABELS:
+    label = tokens.pop()
+  type_name = tokens.pop()
+  if type_name == "map":
+    _expect(tokens, "<")
+    key_type = tokens.pop()
+    _expect(tokens, ",")
+    value_type = tokens.pop()
+    _expect(tokens, ">")
+  name = tokens.pop()
+  _expect(tokens, "=")
+  number = int(tokens.pop())
+  _expect(tokens, ";")
+
+  field_proto = message_proto.field.add(
+      name=name, number=number, label=_LABELS[label])
+  if oneof_index is not None:
+    field_proto.oneof_index = oneof_index
+  if type_name != "map":
+    _set_type(field_proto, type_name, file_proto.package)
+    return
+
+  entry_name = "".join(part.capitalize() for part in name.split("_")) + "Entry"
+  entry_proto = message_proto.nested_type.add(name=entry_name)
+  entry_proto.options.map_entry = True
+  _set_type(
+      entry_proto.field.add(
+          name="key", number=1, label=_FieldProto.LABEL_OPTIONAL), key_type,
+      file_proto.package)
+  _set_type(
+      entry_proto.field.add(
+          name="value", number=2, label=_FieldProto.LABEL_OPTIONAL),
+      value_type, file_proto.package)
+  field_proto.label = _FieldProto.LABEL_REPEATED
+  field_proto.type = _FieldProto.TYPE_MESSAGE
+  field_proto.type_name = ".{}.{}.{}".format(file_proto.package,
+                                             message_proto.name, entry_name)
+
+
+def _set_type(field_proto, type_name, package):
+  if type_name in _SCALAR_TYPES:
+    field_proto.type = _SCALAR_TYPES[type_name]
+    return
+  field_proto.type = _FieldProto.TYPE_MESSAGE
+  if type_name == _ANY_TYPE:
+    field_proto.type_name = "." + _ANY_TYPE
+  else:
+    field_proto.type_name = ".{}.{}".format(package, type_name)
+
+
+def _expect(tokens, token):
+  actual = tokens.pop()
+  if actual != token:
+    raise SyntaxError("Expected [{}], got [{}].".format(token, actual))
@@ -0,0 +1,126 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of pyproto.registry."""
+
+import unittest
+
+from pyproto import converter
+from pyproto import registry
+
+import protos
+
+test_pb2 = protos.make_module(
+    "registry_test_pb2", "pyproto.tests.registry", """
+  A { int32 x = 1; int32 y = 2; int32 z = 3; }
+  B { int32 x = 1; int32 y = 2; int32 z = 3; }
+  C { int32 x = 1; }
+""")
+
+
+class SubclassConverter(converter.ProtoConverter):
+  pass
+
+
+class ConverterRegistryTest(unittest.TestCase):
+
+  def test_hits_and_misses(self):
+    converter_registry = registry.ConverterRegistry()
+    first = converter_registry.get(test_pb2.A, test_pb2.B)
+    self.assertEqual(converter_registry.cache_info(),
+                     registry.CacheInfo(0, 1, registry.DEFAULT_MAXSIZE, 1))
+
+    self.assertIs(converter_registry.get(test_pb2.A, test_pb2.B), first)
+    self.assertIs(converter_registry.get(test_pb2.A, test_pb2.B, []), first)
+    self.assertEqual((converter_registry.hits, converter_registry.misses),
+                     (2, 1))
+
+    converter_registry.get(test_pb2.B, test_pb2.A)
+    converter_registry.get(test_pb2.A, test_pb2.C, ["y", "z"])
+    self.assertEqual(converter_registry.cache_info(),
+                     registry.CacheInfo(2, 3, registry.DEFAULT_MAXSIZE, 3))
+
+    converter_registry.clear()
+    self.assertEqual(converter_registry.cache_info(),
+                     registry.CacheInfo(0, 0, registry.DEFAULT_MAXSIZE, 0))
+    self.assertIsNot(converter_registry.get(test_pb2.A, test_pb2.B), first)
+
+  def test_field_names_to_ignore_order(self):
+    converter_registry = registry.ConverterRegistry()
+    proto_converter = converter_registry.get(test_pb2.A, test_pb2.C,
+                                             ["y", "z"])
+    self.assertIs(
+        converter_registry.get(test_pb2.A, test_pb2.C, ["z", "y"]),
+        proto_converter)
+    self.assertIs(
+        converter_registry.get(test_pb2.A, test_pb2.C, ("z", "y", "z")),
+        proto_converter)
+    self.assertEqual(converter_registry.cache_info().currsize, 1)
+    self.assertIsNot(
+        converter_registry.get(test_pb2.A, test_pb2.B, ["y"]),
+        converter_registry.get(test_pb2.A, test_pb2.B, ["z"]))
+
+  def test_converter_class(self):
+    converter_registry = registry.ConverterRegistry()
+    proto_converter = converter_registry.get(test_pb2.A, test_pb2.B)
+    subclass_converter = converter_registry.get(
+        test_pb2.A, test_pb2.B, converter_class=SubclassConverter)
+    self.assertIsInstance(subclass_converter, SubclassConverter)
+    self.assertIsNot(subclass_converter, proto_converter)
+    self.assertIs(
+        converter_registry.get(
+            test_pb2.A, test_pb2.B, converter_class=SubclassConverter),
+        subclass_converter)
+
+  def test_lru_eviction(self):
+    converter_registry = registry.ConverterRegistry(maxsize=2)
+    a_to_b = converter_registry.get(test_pb2.A, test_pb2.B)
+    b_to_a = converter_registry.get(test_pb2.B, test_pb2.A)
+    # A -> B becomes the most recently used, so B -> A is evicted.
+    self.assertIs(converter_registry.get(test_pb2.A, test_pb2.B), a_to_b)
+    a_to_c = converter_registry.get(test_pb2.A, test_pb2.C, ["y", "z"])
+    self.assertEqual(converter_registry.cache_info(),
+                     registry.CacheInfo(1, 3, 2, 2))
+
+    self.assertIs(converter_registry.get(test_pb2.A, test_pb2.B), a_to_b)
+    self.assertIs(
+        converter_registry.get(test_pb2.A, test_pb2.C, ["y", "z"]), a_to_c)
+    self.assertIsNot(converter_registry.get(test_pb2.B, test_pb2.A), b_to_a)
+    self.assertEqual(converter_registry.cache_info(),
+                     registry.CacheInfo(3, 4, 2, 2))
+    # Re-creating B -> A evicted A -> B, the least recently used.
+    self.assertIs(
+        converter_registry.get(test_pb2.A, test_pb2.C, ["y", "z"]), a_to_c)
+    self.assertIsNot(converter_registry.get(test_pb2.A, test_pb2.B), a_to_b)
+
+  def test_invalid_maxsize(self):
+    with self.assertRaises(ValueError):
+      registry.ConverterRegistry(maxsize=0)
+
+  def test_unhandled_fields_are_not_cached(self):
+    converter_registry = registry.ConverterRegistry()
+    for _ in range(2):
+      with self.assertRaises(NotImplementedError):
+        converter_registry.get(test_pb2.A, test_pb2.C)
+    self.assertEqual(converter_registry.cache_info(),
+                     registry.CacheInfo(0, 2, registry.DEFAULT_MAXSIZE, 0))
+
+  def test_default_registry(self):
+    self.assertIs(
+        registry.get_converter(test_pb2.A, test_pb2.B),
+        registry.default_registry().get(test_pb2.A, test_pb2.B))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,126 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of pyproto.stream."""
+
+import io
+import unittest
+
+from google.protobuf import message
+
+from pyproto import converter
+from pyproto import stream
+from pyproto import wire
+
+import protos
+
+test_pb2 = protos.make_module(
+    "stream_test_pb2", "pyproto.tests.stream", """
+  Record { int32 id = 1; string payload = 2; }
+  RenumberedRecord { int32 id = 5; string payload = 6; }
+""")
+
+# Records of 0, 1, 127, 128 and 16384 bytes: lengths of one to three bytes.
+_RECORDS = [b"", b"a", b"b" * 127, b"c" * 128, b"d" * 16384, b"e" * 3]
+
+
+def _delimited(records):
+  return b"".join(wire.encode_varint(len(record)) + record
+                  for record in records)
+
+
+class ReadDelimitedTest(unittest.TestCase):
+
+  def test_block_boundaries(self):
+    # Block sizes smaller than the records and than the varint lengths split
+    # both across blocks.
+    for block_size in (1, 2, 3, 7, 100, 128, 129, 1 << 20):
+      with self.subTest(block_size=block_size):
+        self.assertEqual(
+            list(
+                stream.read_delimited(
+                    io.BytesIO(_delimited(_RECORDS)), block_size)), _RECORDS)
+
+  def test_empty(self):
+    self.assertEqual(list(stream.read_delimited(io.BytesIO(b""))), [])
+
+  def test_truncated(self):
+    records = [b"a", b"b" * 127, b"c" * 300]
+    data = _delimited(records)
+    boundaries = {0}
+    for record in records:
+      boundaries.add(max(boundaries) + len(_delimited([record])))
+    for size in range(len(data)):
+      if size in boundaries:
+        continue
+      for block_size in (1, 64, 1 << 20):
+        with self.subTest(size=size, block_size=block_size):
+          with self.assertRaises(message.DecodeError):
+            list(stream.read_delimited(io.BytesIO(data[:size]), block_size))
+
+  def test_too_long_length(self):
+    with self.assertRaises(message.DecodeError):
+      list(stream.read_delimited(io.BytesIO(b"\xff" * 11)))
+
+
+class WriteDelimitedTest(unittest.TestCase):
+
+  def test_round_trip(self):
+    for block_size in (1, 3, 200, 1 << 20):
+      with self.subTest(block_size=block_size):
+        writer = io.BytesIO()
+        self.assertEqual(
+            stream.write_delimited(writer, iter(_RECORDS), block_size),
+            len(_RECORDS))
+        self.assertEqual(writer.getvalue(), _delimited(_RECORDS))
+        self.assertEqual(
+            list(
+                stream.read_delimited(
+                    io.BytesIO(writer.getvalue()), block_size)), _RECORDS)
+
+
+class ConvertStreamTest(unittest.TestCase):
+
+  def test_convert_stream(self):
+    proto_converter = converter.ProtoConverter(test_pb2.Record,
+                                               test_pb2.RenumberedRecord)
+    src_protos = [
+        test_pb2.Record(id=i, payload="x" * (i * 37)) for i in range(100)
+    ]
+    src_bytes = _delimited(
+        [src_proto.SerializeToString() for src_proto in src_protos])
+
+    for block_size in (1, 10, 1000, 1 << 20):
+      with self.subTest(block_size=block_size):
+        writer = io.BytesIO()
+        self.assertEqual(
+            stream.convert_stream(proto_converter, io.BytesIO(src_bytes),
+                                  writer, block_size), len(src_protos))
+        self.assertEqual([
+            test_pb2.RenumberedRecord.FromString(record)
+            for record in stream.read_delimited(io.BytesIO(writer.getvalue()))
+        ], [proto_converter.convert(src_proto) for src_proto in src_protos])
+
+  def test_truncated(self):
+    proto_converter = converter.ProtoConverter(test_pb2.Record,
+                                               test_pb2.RenumberedRecord)
+    src_bytes = _delimited(
+        [test_pb2.Record(id=1, payload="abc").SerializeToString()])
+    with self.assertRaises(message.DecodeError):
+      stream.convert_stream(proto_converter, io.BytesIO(src_bytes[:-1]),
+                            io.BytesIO())
+
+
+if __name__ == "__main__":
+  unittest.main()
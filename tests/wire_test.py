@@ -0,0 +1,154 @@
+# Copyright 2021 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests of pyproto.wire."""
+
+import unittest
+
+from google.protobuf import message
+
+from pyproto import wire
+
+
+def _tag(field_number, wire_type):
+  return wire.encode_varint(wire.make_tag(field_number, wire_type))
+
+
+def _varint_field(field_number, value):
+  return _tag(field_number, wire.WIRETYPE_VARINT) + wire.encode_varint(value)
+
+
+def _bytes_field(field_number, value):
+  return (_tag(field_number, wire.WIRETYPE_LENGTH_DELIMITED) +
+          wire.encode_varint(len(value)) + value)
+
+
+def _renumber(src_number, dest_number):
+  return {
+      wire.make_tag(src_number, wire_type):
+      _tag(dest_number, wire_type) for wire_type in wire.FIELD_WIRETYPES
+  }
+
+
+class VarintTest(unittest.TestCase):
+
+  def test_round_trip(self):
+    for value in (0, 1, 127, 128, 300, 2**32, 2**64 - 1):
+      encoded = wire.encode_varint(value)
+      self.assertEqual(wire.decode_varint(encoded, 0), (value, len(encoded)))
+
+  def test_truncated(self):
+    with self.assertRaises(message.DecodeError):
+      wire.decode_varint(b"\x80\x80", 0)
+
+  def test_too_long(self):
+    with self.assertRaises(message.DecodeError):
+      wire.decode_varint(b"\xff" * 10 + b"\x01", 0)
+
+
+class TranscodeTest(unittest.TestCase):
+
+  def test_renumbers_all_wire_types(self):
+    src_bytes = (
+        _varint_field(1, 300) +
+        _tag(2, wire.WIRETYPE_FIXED64) + b"12345678" +
+        _bytes_field(3, b"abc") +
+        _tag(4, wire.WIRETYPE_FIXED32) + b"1234")
+    tag_table = {}
+    for number in range(1, 5):
+      tag_table.update(_renumber(number, number + 10))
+
+    dest, fallback = wire.transcode(src_bytes, tag_table)
+
+    self.assertEqual(
+        bytes(dest),
+        _varint_field(11, 300) +
+        _tag(12, wire.WIRETYPE_FIXED64) + b"12345678" +
+        _bytes_field(13, b"abc") +
+        _tag(14, wire.WIRETYPE_FIXED32) + b"1234")
+    self.assertEqual(bytes(fallback), b"")
+
+  def test_multi_byte_tags(self):
+    src_bytes = _varint_field(1000, 5) + _bytes_field(2, b"x" * 200)
+    tag_table = _renumber(1000, 1)
+    tag_table.update(_renumber(2, 5000))
+
+    dest, _ = wire.transcode(src_bytes, tag_table)
+
+    self.assertEqual(
+        bytes(dest), _varint_field(1, 5) + _bytes_field(5000, b"x" * 200))
+
+  def test_fallback_and_dropped_fields(self):
+    src_bytes = _varint_field(1, 1) + _varint_field(2, 2) + _varint_field(3, 3)
+    tag_table = _renumber(1, 1)
+    tag_table[wire.make_tag(2, wire.WIRETYPE_VARINT)] = wire.FALLBACK
+
+    dest, fallback = wire.transcode(src_bytes, tag_table)
+
+    self.assertEqual(bytes(dest), _varint_field(1, 1))
+    self.assertEqual(bytes(fallback), _varint_field(2, 2))
+
+  def test_groups(self):
+    group = (
+        _tag(7, wire.WIRETYPE_START_GROUP) + _varint_field(1, 1) +
+        _tag(8, wire.WIRETYPE_START_GROUP) + _bytes_field(2, b"x") +
+        _tag(8, wire.WIRETYPE_END_GROUP) + _tag(7, wire.WIRETYPE_END_GROUP))
+    src_bytes = group + _varint_field(1, 1)
+    tag_table = _renumber(1, 2)
+
+    dest, fallback = wire.transcode(src_bytes, tag_table)
+    self.assertEqual(bytes(dest), _varint_field(2, 1))
+    self.assertEqual(bytes(fallback), b"")
+
+    tag_table[wire.make_tag(7, wire.WIRETYPE_START_GROUP)] = wire.FALLBACK
+    dest, fallback = wire.transcode(src_bytes, tag_table)
+    self.assertEqual(bytes(dest), _varint_field(2, 1))
+    self.assertEqual(bytes(fallback), group)
+
+  def test_missing_group_end(self):
+    src_bytes = _tag(7, wire.WIRETYPE_START_GROUP) + _varint_field(1, 1)
+    with self.assertRaises(message.DecodeError):
+      wire.transcode(src_bytes, {})
+
+  def test_unexpected_group_end(self):
+    with self.assertRaises(message.DecodeError):
+      wire.transcode(_tag(7, wire.WIRETYPE_END_GROUP), {})
+
+  def test_truncated(self):
+    valid_bytes = (
+        _varint_field(1, 300) + _bytes_field(2, b"abc") +
+        _tag(3, wire.WIRETYPE_FIXED64) + b"12345678" +
+        _tag(4, wire.WIRETYPE_FIXED32) + b"1234" + _varint_field(1000, 1))
+    tag_table = {}
+    for number in (1, 2, 3, 4, 1000):
+      tag_table.update(_renumber(number, number))
+    self.assertEqual(bytes(wire.transcode(valid_bytes, tag_table)[0]),
+                     valid_bytes)
+
+    boundaries = {0}
+    for field_bytes in (_varint_field(1, 300), _bytes_field(2, b"abc"),
+                        _tag(3, wire.WIRETYPE_FIXED64) + b"12345678",
+                        _tag(4, wire.WIRETYPE_FIXED32) + b"1234",
+                        _varint_field(1000, 1)):
+      boundaries.add(max(boundaries) + len(field_bytes))
+    for size in range(len(valid_bytes)):
+      if size in boundaries:
+        continue
+      with self.subTest(size=size):
+        with self.assertRaises(message.DecodeError):
+          wire.transcode(valid_bytes[:size], tag_table)
+
+
+if __name__ == "__main__":
+  unittest.main()